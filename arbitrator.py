@@ -1,4 +1,5 @@
 """Class for making arbitrator object"""
+import heapq
 import random
 
 
@@ -8,6 +9,31 @@ class Arbitrator:
         self.bbcon = this_bbcon
         self.det_choose_action = bbcon_det  # boolean used to let bbcon decide
         # if it wants to use deterministic choose_action
+        self.winner = None  # the behavior chosen in the last call to choose_action
+
+    def weight_changed(self, this_behavior):
+        """Called by a behavior when its weight has changed. Not needed by this arbitrator"""
+
+    def weights_changed(self, behaviors):
+        """Called by a behavior table with all the behaviors whose weight changed in one timestep"""
+        for this_behavior in behaviors:
+            self.weight_changed(this_behavior)
+
+    def behaviors_activated(self, behaviors):
+        """Called by bbcon when several behaviors are added to the active behaviors at once"""
+        for this_behavior in behaviors:
+            self.behavior_activated(this_behavior)
+
+    def behaviors_deactivated(self, behaviors):
+        """Called by bbcon when several behaviors are removed from the active behaviors at once"""
+        for this_behavior in behaviors:
+            self.behavior_deactivated(this_behavior)
+
+    def behavior_activated(self, this_behavior):
+        """Called by bbcon when a behavior is added to the active behaviors. Not needed by this arbitrator"""
+
+    def behavior_deactivated(self, this_behavior):
+        """Called by bbcon when a behavior is removed from the active behaviors. Not needed by this arbitrator"""
 
     def choose_action(self):
         """Calls deterministic og stochastic choose_action
@@ -27,7 +53,7 @@ class Arbitrator:
             if this_behavior.get_weight() > max_weight:  # if there is a behavior with larger weight
                 winner_behavior = this_behavior
                 max_weight = this_behavior.get_weight()
-        print("******* winner: ", winner_behavior)
+        self.winner = winner_behavior
         return [winner_behavior.get_motor_recs(), winner_behavior.get_halt_request()]
         # return motor recommendation and halt_request of behavior with largest weight
 
@@ -45,14 +71,225 @@ class Arbitrator:
             dict_behaviors[this_behavior] = [num, num + weight]
             num += weight
 
-        random_num = random.randint(0, num)
-        winner_behavior = None
+        random_num = random.uniform(0, num)
+        winner_behavior = active_behaviors[0]
 
         # Iterate through dictionary and sets winner_behavior
         # equal the one with weight range that covers r
         for key, value in dict_behaviors.items():
-            if value[1] < random_num:  # makes sure r matches with largest possible weight range
+            if value[0] <= random_num:  # the last range starting below r is the one that covers r
                 winner_behavior = key
+        self.winner = winner_behavior
         return winner_behavior.get_motor_recs(), winner_behavior.get_halt_request()
         # return motor recommendation and halt_request of behavior with weight
         # that covers r
+
+
+class FenwickTree:
+    """Binary indexed tree over a growing list of weights. Changing a weight, prefix sums and finding the
+    index that covers a cumulative weight all take O(log n)"""
+
+    def __init__(self):
+        self.weights = []
+        self.tree = [0.0]  # 1-based
+
+    def __len__(self):
+        return len(self.weights)
+
+    def rebuild(self):
+        """Rebuilds the tree from weights in O(n), after many of them were changed directly"""
+        self.tree = [0.0] + self.weights
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def append(self, weight=0.0):
+        """Adds a weight at the end, and returns its index"""
+        self.weights.append(weight)
+        i = len(self.weights)
+        # tree[i] covers the weights (i - lowbit(i), i]
+        self.tree.append(weight + self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i)))
+        return i - 1
+
+    def set(self, index, weight):
+        """Changes the weight at index"""
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count):
+        """Returns the sum of the first count weights"""
+        total = 0.0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def total(self):
+        """Returns the sum of all weights"""
+        return self.prefix_sum(len(self.weights))
+
+    def find(self, value):
+        """Returns the index whose cumulative weight range [prefix, prefix + weight) covers value"""
+        index = 0
+        step = 1 << len(self.weights).bit_length()
+        while step:
+            if index + step < len(self.tree) and self.tree[index + step] <= value:
+                index += step
+                value -= self.tree[index]
+            step >>= 1
+        return min(index, len(self.weights) - 1)
+
+
+class IndexedArbitrator(Arbitrator):
+    """Arbitrator for many behaviors. The weights of the active behaviors are kept in a Fenwick tree and a
+    max-heap that are updated incrementally when a weight changes or a behavior is (de)activated, so no mode
+    scans all behaviors. Modes:
+    deterministic: the behavior with largest weight (ties go to the behavior registered first)
+    stochastic: a behavior drawn with probability proportional to its weight, in O(log n)
+    top_k: a behavior drawn proportional to weight among the k heaviest
+    blended: the weighted average of the wheel speeds recommended by the k heaviest, as ["V", left, right].
+        A heaviest behavior that stops the robot (["S"]) or requests a halt wins unblended"""
+    MODES = ('deterministic', 'stochastic', 'top_k', 'blended')
+
+    def __init__(self, this_bbcon, mode='stochastic', k=3, seed=None):
+        """seed: seed for the random number generator, for reproducible runs"""
+        if mode not in self.MODES:
+            raise ValueError('Unknown arbitration mode: ' + mode)
+        super(IndexedArbitrator, self).__init__(this_bbcon, mode == 'deterministic')
+        self.mode = mode
+        self.k = k
+        self.rng = random.Random(seed)
+        self.behaviors = []  # index -> behavior
+        self.indices = {}  # behavior -> index
+        self.active = []  # index -> True if active
+        self.tree = FenwickTree()  # effective weights: the weight if active, else 0
+        self.heap = []  # (-weight, index, version), stale entries are skipped when popped
+        self.versions = []  # index -> version of the current heap entry
+
+    def get_index(self, this_behavior):
+        """Returns the index of a behavior, registering it the first time it is seen"""
+        index = self.indices.get(this_behavior)
+        if index is None:
+            index = self.tree.append(0.0)
+            self.indices[this_behavior] = index
+            self.behaviors.append(this_behavior)
+            self.active.append(False)
+            self.versions.append(0)
+        return index
+
+    def refresh(self, this_behavior):
+        """Writes the current effective weight of a behavior to the tree and the heap"""
+        index = self.get_index(this_behavior)
+        weight = this_behavior.get_weight() if self.active[index] else 0.0
+        self.tree.set(index, weight)
+        self.versions[index] += 1
+        if self.active[index]:
+            heapq.heappush(self.heap, (-weight, index, self.versions[index]))
+        if len(self.heap) > 4 * len(self.behaviors) + 64:  # Too many stale entries
+            self.heap = [(-self.behaviors[i].get_weight(), i, self.versions[i])
+                         for i in range(len(self.behaviors)) if self.active[i]]
+            heapq.heapify(self.heap)
+
+    def weight_changed(self, this_behavior):
+        self.refresh(this_behavior)
+
+    def weights_changed(self, behaviors):
+        self.refresh_many(behaviors)
+
+    def behaviors_activated(self, behaviors):
+        for this_behavior in behaviors:
+            self.active[self.get_index(this_behavior)] = True
+        self.refresh_many(behaviors)
+
+    def behaviors_deactivated(self, behaviors):
+        for this_behavior in behaviors:
+            self.active[self.get_index(this_behavior)] = False
+        self.refresh_many(behaviors)
+
+    def refresh_many(self, behaviors):
+        """Refreshes the behaviors one by one, or rebuilds the tree and the heap in O(n) when many changed"""
+        if len(behaviors) * 8 < len(self.behaviors):
+            for this_behavior in behaviors:
+                self.refresh(this_behavior)
+            return
+        for this_behavior in behaviors:
+            index = self.get_index(this_behavior)
+            self.tree.weights[index] = this_behavior.get_weight() if self.active[index] else 0.0
+            self.versions[index] += 1
+        self.tree.rebuild()
+        self.heap = [(-self.tree.weights[i], i, self.versions[i]) for i in range(len(self.behaviors)) if self.active[i]]
+        heapq.heapify(self.heap)
+
+    def behavior_activated(self, this_behavior):
+        self.active[self.get_index(this_behavior)] = True
+        self.refresh(this_behavior)
+
+    def behavior_deactivated(self, this_behavior):
+        self.active[self.get_index(this_behavior)] = False
+        self.refresh(this_behavior)
+
+    def heaviest(self, count):
+        """Returns the indices of the `count` heaviest active behaviors, heaviest first"""
+        found = []
+        while self.heap and len(found) < count:
+            entry = self.heap[0]
+            if entry[2] != self.versions[entry[1]] or not self.active[entry[1]]:
+                heapq.heappop(self.heap)  # Stale
+                continue
+            found.append(heapq.heappop(self.heap))
+        for entry in found:
+            heapq.heappush(self.heap, entry)
+        return [entry[1] for entry in found]
+
+    def choose_action(self):
+        """Chooses an action according to mode. Returns [motor_recs, halt_request]"""
+        if self.mode == 'deterministic':
+            winner_index = self.heaviest(1)[0]
+        elif self.mode == 'stochastic':
+            total = self.tree.total()
+            winner_index = self.tree.find(self.rng.random() * total) if total > 0 else self.heaviest(1)[0]
+        elif self.mode == 'top_k':
+            candidates = self.heaviest(self.k)
+            weights = [self.tree.weights[index] for index in candidates]
+            winner_index = self.rng.choices(candidates, weights)[0] if sum(weights) > 0 else candidates[0]
+        else:
+            return self.choose_action_blended()
+        self.winner = self.behaviors[winner_index]
+        return [self.winner.get_motor_recs(), self.winner.get_halt_request()]
+
+    def choose_action_blended(self):
+        """Blends the wheel speeds of the k heaviest behaviors by weight. The heaviest is the winner.
+        A stop or a halt request of the winner is passed on as it is, the rest of the controller looks for ["S"]"""
+        candidates = self.heaviest(self.k)
+        self.winner = self.behaviors[candidates[0]]
+        total = sum(self.tree.weights[index] for index in candidates)
+        if total <= 0 or len(self.winner.get_motor_recs()) == 1 or self.winner.get_halt_request():
+            return [self.winner.get_motor_recs(), self.winner.get_halt_request()]
+        left = right = 0.0
+        for index in candidates:
+            weight = self.tree.weights[index] / total
+            wheels = wheel_speeds(self.behaviors[index].get_motor_recs())
+            left += weight * wheels[0]
+            right += weight * wheels[1]
+        return [["V", left, right], self.winner.get_halt_request()]
+
+
+def wheel_speeds(motor_recs):
+    """Converts a motor recommendation to [left, right] wheel speeds in [-1, 1]"""
+    direction = motor_recs[0]
+    if direction == "F":
+        return [motor_recs[1], motor_recs[1]]
+    if direction == "B":
+        return [-motor_recs[1], -motor_recs[1]]
+    if direction == "L":
+        return [-motor_recs[1], motor_recs[1]]
+    if direction == "R":
+        return [motor_recs[1], -motor_recs[1]]
+    if direction == "V":
+        return [motor_recs[1], motor_recs[2]]
+    return [0.0, 0.0]
@@ -0,0 +1,73 @@
+"""Asyncio variant of the behavior-based controller. The sensobs are polled concurrently,
+so a timestep costs as much as the slowest sensor instead of the sum of all of them"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from zumo_button import ZumoButton
+import bbcon
+
+
+class AsyncBbcon(bbcon.Bbcon):
+    """Behavior-Based Controller that runs the blocking sensob updates at the same time in an executor.
+    Behaviors, arbitrator and motob are updated exactly as in Bbcon"""
+
+    def __init__(self, tick_rate=None, telemetry_path=None, executor=None):
+        """executor: the executor the blocking sensob updates run in. One thread per sensob if not given"""
+        super(AsyncBbcon, self).__init__(tick_rate, telemetry_path)
+        self.executor = executor if executor else ThreadPoolExecutor(max_workers=max(1, len(self.sensobs)))
+
+    async def run_one_timestep_async(self):
+        """method for core BBCON activity, with the sensob updates running concurrently"""
+
+        with self.latency.measure('timestep'):
+            # Update the sensobs concurrently, and wait until all of them are done:
+            with self.latency.measure('sensobs'):
+                await self.update_sensobs_async()
+
+            # Update behaviors, invoke arbitrator and update the motob:
+            self.act()
+
+        # Wait:
+        await self.wait_async()
+
+        # Reset the sensobs:
+        self.reset_sensobs()
+
+    async def update_sensobs_async(self):
+        """Runs update() for every sensob that needs it in the executor"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, self.update_sensob, this_sensob)
+                               for this_sensob in self.sensobs_to_update()])
+
+    async def wait_async(self):
+        """Waits until the next timestep without blocking the event loop"""
+        if self.scheduler:
+            await asyncio.sleep(self.scheduler.delay())
+        else:
+            await asyncio.sleep(0.5)
+
+
+async def main_async(tick_rate=None, telemetry_path='telemetry.bin'):
+    """Coroutine running the controller until a behavior requests a halt"""
+    controller = AsyncBbcon(tick_rate, telemetry_path)
+    ZumoButton().wait_for_press()  # place Zumo in waiting-loop until button is pressed
+    if controller.scheduler:
+        controller.scheduler.start()
+    while True:
+        await controller.run_one_timestep_async()
+        if controller.halt_request:
+            print('Robot finished')
+            break
+    if controller.scheduler:
+        print('Scheduler: ', controller.scheduler.get_stats())
+    print(controller.latency.report())
+    controller.telemetry.close()
+    controller.executor.shutdown()
+
+
+def main(tick_rate=None, telemetry_path='telemetry.bin'):
+    """main-method for starting process with the asyncio controller"""
+    asyncio.run(main_async(tick_rate, telemetry_path))
+
+
+if __name__ == '__main__':
+    main()
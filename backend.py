@@ -0,0 +1,146 @@
+"""Hardware backend layer. The driver modules reach RPi.GPIO, wiringpi, the camera and the clock through this
+module, so the same code runs on the robot or against the simulator (see simulator.py).
+The backend is chosen with use(), or with the PLAB_BACKEND environment variable ('hardware' or 'sim').
+If neither is done, the hardware backend is loaded the first time it is needed"""
+import os
+import threading
+import time
+from PIL import Image
+
+
+class HardwareBackend:
+    """The real robot: RPi.GPIO, wiringpi, raspistill and the system clock"""
+
+    def __init__(self):
+        import RPi.GPIO
+        import wiringpi
+        self.GPIO = RPi.GPIO
+        self.wiringpi = wiringpi
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def wait_for(self, condition, predicate, timeout):
+        with condition:
+            return condition.wait_for(predicate, timeout)
+
+    def start_periodic(self, period, func):
+        return PeriodicThread(period, func)
+
+    def capture(self, width, height, rot):
+        """Takes a picture with raspistill and returns it as an RGB PIL image"""
+        # This is a OS call that takes a image and makes it accessible to PIL operations in the same directory
+        os.system('raspistill -t 1 -o image.png -w "' + str(width) + '" -h "' + str(height) + '" -rot "' + str(rot) + '"')
+        # Open the image just taken by raspicam
+        return Image.open('image.png').convert('RGB')
+
+    def open_stream(self, width, height, rot):
+        """Starts raspividyuv streaming frames into a pipe"""
+        import frame_stream
+        return frame_stream.FrameStream(frame_stream.raspividyuv_command(width, height), width, height,
+                                        frame_stream.padded_size(width, height), rot)
+
+
+class PeriodicThread:
+    """Calls func every period seconds (start to start) in a daemon thread, until stop().
+    If a call takes longer than period, the next one starts right after it"""
+
+    def __init__(self, period, func):
+        self.period = period
+        self.func = func
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        due = time.monotonic()
+        while not self.stopped.is_set():
+            self.func()
+            due = max(due + self.period, time.monotonic())
+            self.stopped.wait(due - time.monotonic())
+
+    def stop(self):
+        self.stopped.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+
+_backend = None
+
+
+def use(name='hardware', **kwargs):
+    """Selects the backend. kwargs are passed on to the backend, e.g. world= for the simulator"""
+    global _backend
+    if name == 'hardware':
+        _backend = HardwareBackend(**kwargs)
+    elif name == 'sim':
+        import simulator
+        _backend = simulator.SimBackend(**kwargs)
+    else:
+        raise ValueError('Unknown backend: ' + name)
+    return _backend
+
+
+def get():
+    """Returns the current backend"""
+    if _backend is None:
+        use(os.environ.get('PLAB_BACKEND', 'hardware'))
+    return _backend
+
+
+class _Proxy:
+    """Module-like object that forwards attribute lookups to a module of the current backend,
+    so `from backend import GPIO` keeps working when the backend is changed later"""
+
+    def __init__(self, attribute):
+        self._attribute = attribute
+
+    def __getattr__(self, name):
+        return getattr(getattr(get(), self._attribute), name)
+
+
+GPIO = _Proxy('GPIO')
+wiringpi = _Proxy('wiringpi')
+
+
+def sleep(seconds):
+    """Sleeps on the backend clock"""
+    get().sleep(seconds)
+
+
+def monotonic():
+    """Returns the backend clock in seconds"""
+    return get().monotonic()
+
+
+def monotonic_ns():
+    """Returns the backend clock in integer nanoseconds"""
+    return get().monotonic_ns()
+
+
+def wait_for(condition, predicate, timeout):
+    """Waits on a threading.Condition until predicate() is true, at most timeout seconds of backend time.
+    Returns the last value of predicate(). GPIO event callbacks must notify the condition"""
+    return get().wait_for(condition, predicate, timeout)
+
+
+def start_periodic(period, func):
+    """Calls func every period seconds of backend time in the background. Returns an object whose stop() ends it"""
+    return get().start_periodic(period, func)
+
+
+def capture(width, height, rot=0):
+    """Takes a picture with the backend camera and returns it as an RGB PIL image"""
+    return get().capture(width, height, rot)
+
+
+def open_stream(width, height, rot=0):
+    """Starts streaming from the backend camera. Returns a stream whose get_frame() returns the latest frame as
+    an RGB PIL image, and close() stops it (see frame_stream.py)"""
+    return get().open_stream(width, height, rot)
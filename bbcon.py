@@ -1,24 +1,46 @@
 """Behavior-based controller. Called by robot at each timestep to determine its next move"""
-from time import sleep
+from backend import sleep, monotonic
+import numpy as np
 from zumo_button import ZumoButton
 import motob
 import behavior
+import behavior_table
 import arbitrator
-import sensob
+import scheduler
+import latency
+import telemetry
+import recording
+import ranging
+import ultrasonic
 
 
 class Bbcon:
     """Class for making Behavior-Based Controller"""
-    def __init__(self):
-        """initialize controller-object. One object per robot -> initialized one time at start"""
-        self.behaviors = []
+    def __init__(self, tick_rate=None, telemetry_path=None, arbitration_mode=None, behavior_rows=None):
+        """initialize controller-object. One object per robot -> initialized one time at start.
+        tick_rate: timesteps per second for the fixed-rate scheduler. None keeps the fixed 0.5 s wait
+        telemetry_path: file the telemetry records are written to. None keeps them in memory only
+        arbitration_mode: mode of the IndexedArbitrator, None for the deterministic Arbitrator
+        behavior_rows: rows of extra behaviors, evaluated together as a BehaviorTable (see behavior_table.py)"""
+        self.behaviors = []  # All behaviors, including the rows of the behavior tables
+        self.plain_behaviors = []  # The behaviors that are not rows of a table, and update themselves
+        self.behavior_indices = {}  # behavior -> index in behaviors
+        self.behavior_tables = []
+        self.table_offsets = []  # Index in behaviors of the first row of every table
         self.active_behaviors = []
         # self.inactive_behaviors = [] Mangler bruk av denne
         self.sensobs = []
         self.motobs = None
-        self.arbitrator = arbitrator.Arbitrator(self, True)
+        if arbitration_mode:
+            self.arbitrator = arbitrator.IndexedArbitrator(self, arbitration_mode)
+        else:
+            self.arbitrator = arbitrator.Arbitrator(self, True)
         self.halt_request = False
         self.motor_recs = ''
+        self.scheduler = scheduler.Scheduler(tick_rate) if tick_rate else None
+        self.latency = latency.LatencyStats()  # Per-stage durations of the timesteps
+        self.tick = 0  # Number of timesteps run
+        self.prefetch = True  # Let sensobs that behaviors will need soon sample in the background
 
         # One instance per robot -> behaviors, sensobs and motobs are added at initialization
 
@@ -28,19 +50,40 @@ class Bbcon:
         self.add_behavior(behavior.CollisionDetectionBehaviour(self))
         self.add_behavior(behavior.AvoidObstacleBehaviour(self))
         self.add_behavior(behavior.AttackBehaviour(self))
+        if behavior_rows:
+            self.add_behavior_table(behavior_table.BehaviorTable(self, behavior_rows))
 
         # Add all sensobs to BBCON:
         for this_behavior in self.behaviors:
             if (this_behavior.get_sensob() not in self.sensobs) and (this_behavior.get_sensob() is not None):  # sensobs added once
                 self.add_sensob(this_behavior.get_sensob())
 
+        # The sensobs are shared between controllers, so start without any samples or tracks:
+        for this_sensob in self.sensobs:
+            this_sensob.restart()
+
 
         # Add motobs
         self.motobs = motob.Motob()
 
+        self.telemetry = telemetry.Telemetry([this_behavior.get_name() for this_behavior in self.behaviors],
+                                             [type(this_sensob).__name__ for this_sensob in self.sensobs],
+                                             telemetry_path)
+
     def add_behavior(self, new_behavior):
         """append a newly-created behavior object to behaviors list"""
+        self.behavior_indices[new_behavior] = len(self.behaviors)
         self.behaviors.append(new_behavior)
+        self.plain_behaviors.append(new_behavior)
+
+    def add_behavior_table(self, new_table):
+        """append a behavior table, and its behaviors to behaviors list. The rows are only updated, asked for
+        sensobs and logged through the table"""
+        self.behavior_tables.append(new_table)
+        self.table_offsets.append(len(self.behaviors))
+        for new_behavior in new_table.get_behaviors():
+            self.behavior_indices[new_behavior] = len(self.behaviors)
+            self.behaviors.append(new_behavior)
 
     def add_sensob(self, new_sensob):
         """append a newly-created sensob object to sensobs list"""
@@ -50,52 +93,171 @@ class Bbcon:
         """add an existing behavior onto the active-behaviors list"""
         if existing_behavior not in self.active_behaviors:
             self.active_behaviors.append(existing_behavior)
+            self.arbitrator.behavior_activated(existing_behavior)
 
     def deactivate_behavior(self, existing_behavior):
         """remove an existing behavior from the active-behaviors list"""
         if existing_behavior in self.active_behaviors:
             self.active_behaviors.remove(existing_behavior)
+            self.arbitrator.behavior_deactivated(existing_behavior)
+
+    def activate_behaviors(self, behaviors):
+        """add several behaviors onto the active-behaviors list, telling the arbitrator about them in one call"""
+        active = set(self.active_behaviors)
+        added = [this_behavior for this_behavior in behaviors if this_behavior not in active]
+        if added:
+            self.active_behaviors.extend(added)
+            self.arbitrator.behaviors_activated(added)
+
+    def deactivate_behaviors(self, behaviors):
+        """remove several behaviors from the active-behaviors list, telling the arbitrator about them in one call"""
+        active = set(self.active_behaviors)
+        removed = [this_behavior for this_behavior in behaviors if this_behavior in active]
+        if removed:
+            gone = set(removed)
+            self.active_behaviors = [this_behavior for this_behavior in self.active_behaviors
+                                     if this_behavior not in gone]
+            self.arbitrator.behaviors_deactivated(removed)
 
     def run_one_timestep(self):
         """method for core BBCON activity"""
 
-        # Update all sensobs:
+        with self.latency.measure('timestep'):
+            # Update all sensobs:
+            for this_sensob in self.sensobs_to_update():
+                self.update_sensob(this_sensob)  # sensob fetches relevant sensor values (once per timestep)
+
+            # Update behaviors, invoke arbitrator and update the motob:
+            self.act()
+
+        # Wait:
+        self.wait()
+
+        # Reset the sensobs:
+        self.reset_sensobs()
+
+    def sensobs_to_update(self):
+        """Returns the sensobs that should fetch new sensor values this timestep: the ones some behavior needs
+        in its current state (see Behavior.needed_sensobs). Sensobs with a sample younger than their
+        sample_period keep it"""
+        now = monotonic()
+        needed = set()
+        for this_behavior in self.plain_behaviors:
+            needed.update(this_behavior.needed_sensobs())
+        for this_table in self.behavior_tables:
+            needed.update(this_table.needed_sensobs())
+        sensobs_to_update = []
         for this_sensob in self.sensobs:  # sensobs contains no duplicates
-            if isinstance(this_sensob, sensob.CameraSensob) and len(self.motor_recs) != 1:
-                continue
-            this_sensob.update()  # sensob fetches relevant sensor values (once per timestep)
+            if this_sensob in needed and this_sensob.is_due(now):
+                sensobs_to_update.append(this_sensob)
+        return sensobs_to_update
 
-        # Update all behaviors:
-        for this_behavior in self.behaviors:
-            this_behavior.update()
+    def prefetch_sensobs(self):
+        """Asks the sensobs some behavior will need soon to start sampling in the background"""
+        upcoming = set()
+        for this_behavior in self.plain_behaviors:
+            upcoming.update(this_behavior.upcoming_sensobs())
+        for this_sensob in upcoming:
+            this_sensob.prefetch()
+
+    def update_sensob(self, this_sensob):
+        """Updates one sensob, and records how long it took"""
+        with self.latency.measure('sensob ' + type(this_sensob).__name__):
+            this_sensob.update()
+
+    def act(self):
+        """Updates all behaviors, lets the arbitrator choose an action and passes it on to the motob"""
+        # Update all behaviors, the ones in tables all at once:
+        for this_table in self.behavior_tables:
+            with self.latency.measure('behavior table'):
+                this_table.update()
+        for this_behavior in self.plain_behaviors:
+            with self.latency.measure('behavior ' + type(this_behavior).__name__):
+                this_behavior.update()
+        if self.prefetch:
+            self.prefetch_sensobs()
 
         # Invoke arbitrator:
-        action = self.arbitrator.choose_action()
+        with self.latency.measure('arbitrator'):
+            action = self.arbitrator.choose_action()
         self.motor_recs = action[0]
         self.halt_request = action[1]
         # = (motor_rec, half_request)
-        print("******* Motor_recs: ", self.motor_recs)
+        self.log_telemetry()
         # Update the motob by giving motor recommendations:
-        self.motobs.update(self.motor_recs)
+        with self.latency.measure('motob'):
+            self.motobs.update(self.motor_recs)
+        self.tick += 1
 
-        # Wait:
-        sleep(0.5)
+    def log_telemetry(self):
+        """Stores the winner, weights, sensob values and motor recommendations of this timestep"""
+        self.telemetry.log(self.tick, self.behavior_indices[self.arbitrator.winner], self.halt_request,
+                           self.motor_recs, self.get_weights(),
+                           [this_sensob.get_telemetry_value() for this_sensob in self.sensobs])
 
-        # Reset the sensobs:
-        for this_sensob in self.sensobs:
-            this_sensob.reset()
+    def get_weights(self):
+        """Returns the weight of every behavior, in the order of behaviors. The weights of the rows of a table are
+        copied from its array in one operation"""
+        if not self.behavior_tables:
+            return [this_behavior.get_weight() for this_behavior in self.behaviors]
+        weights = np.empty(len(self.behaviors))
+        for this_table, offset in zip(self.behavior_tables, self.table_offsets):
+            weights[offset:offset + len(this_table.behaviors)] = this_table.weights
+        for this_behavior in self.plain_behaviors:
+            weights[self.behavior_indices[this_behavior]] = this_behavior.get_weight()
+        return weights
+
+    def reset_sensobs(self):
+        """Resets the sensobs with a sample older than their max_age at the end of the timestep"""
+        with self.latency.measure('reset'):
+            now = monotonic()
+            for this_sensob in self.sensobs:
+                if this_sensob.is_expired(now):
+                    this_sensob.reset()
+
+    def wait(self):
+        """Waits until the next timestep. Sleeps until the next deadline if a scheduler is used"""
+        if self.scheduler:
+            self.scheduler.wait()
+        else:
+            sleep(0.5)
 
 
-def main():
-    """main-method for starting process"""
-    bbcon = Bbcon()
+def main(tick_rate=None, telemetry_path='telemetry.bin', record_path=None, stream_camera=False, ranging_period=None,
+         edge_events=False):
+    """main-method for starting process. tick_rate: timesteps per second, None for the fixed 0.5 s wait.
+    telemetry_path: file the telemetry is written to, read it with `python telemetry.py telemetry.bin`
+    record_path: file the sensor values are recorded to, replay it with `python replay.py <file>`
+    stream_camera: read the camera from a continuous stream instead of taking a picture per sample
+    ranging_period: ping the ultrasonic sensor in the background every ranging_period seconds, None to ping when
+    the distance is read
+    edge_events: time the ultrasonic echo with GPIO edge callbacks instead of polling the echo pin"""
+    behavior.CAMERA_SENSOB.sensors.streaming = stream_camera
+    behavior.DISTANCE_SENSOB.sensors.edge_events = edge_events
+    ranging_service = ranging.RangingService(ultrasonic.Ultrasonic(edge_events=edge_events, pulse_delay=0),
+                                             period=ranging_period) if ranging_period else None
+    if ranging_service:
+        behavior.DISTANCE_SENSOB.use_ranging(ranging_service)
+    bbcon = Bbcon(tick_rate, telemetry_path)
+    recorder = recording.Recorder(bbcon, record_path) if record_path else None
     state = True
     ZumoButton().wait_for_press()  # place Zumo in waiting-loop until button is pressed
+    if bbcon.scheduler:
+        bbcon.scheduler.start()
     while state:
         bbcon.run_one_timestep()
         if bbcon.halt_request:
             print('Robot finished')
             break
+    if bbcon.scheduler:
+        print('Scheduler: ', bbcon.scheduler.get_stats())
+    print(bbcon.latency.report())
+    bbcon.telemetry.close()
+    if recorder:
+        recorder.close()
+    behavior.CAMERA_SENSOB.sensors.close()
+    if ranging_service:
+        ranging_service.stop()
 
 
 if __name__ == '__main__':
@@ -46,8 +46,9 @@ class Behavior:
         Updates match_degree"""
 
     def update_weight(self):
-        """Computes the weight"""
+        """Computes the weight, and tells the arbitrator about it"""
         self.weight = self.priority * self.match_degree
+        self.bbcon.arbitrator.weight_changed(self)
 
     def get_weight(self):
         """Return the weight"""
@@ -61,10 +62,26 @@ class Behavior:
         """Returns sensob"""
         return self.sensobs
 
+    def needed_sensobs(self):
+        """Returns the sensobs whose values the next call to update() reads, given the current state.
+        Bbcon only updates the sensobs some behavior needs. By default all of them"""
+        if self.sensobs is None:
+            return []
+        return self.sensobs if isinstance(self.sensobs, list) else [self.sensobs]
+
+    def upcoming_sensobs(self):
+        """Returns the sensobs the behavior is likely to need within the next timesteps. Bbcon asks them to
+        prefetch (see Sensob.prefetch). By default none"""
+        return []
+
     def get_halt_request(self):
         """Returns halt_request"""
         return self.halt_request
 
+    def get_name(self):
+        """Returns the name used in the telemetry"""
+        return type(self).__name__
+
 
 class SearchBehaviour(Behavior):
     """Goes forward. Is always active"""
@@ -78,10 +95,14 @@ class SearchBehaviour(Behavior):
     def update(self):
         """Does nothing"""
 
+    def needed_sensobs(self):
+        """Needs no sensobs"""
+        return []
 
 
 class AvoidLineBehaviour(Behavior):
     """Behaviour for staying inside the restricted area"""
+    line_threshold = 0.3  # Tweak, reflectance at or below this is the line
     def __init__(self, bbcon):
         super(AvoidLineBehaviour, self).__init__(bbcon)
         self.sensobs = IR_SENSOB
@@ -92,24 +113,25 @@ class AvoidLineBehaviour(Behavior):
 
     def consider_activation(self):
         """Activates if the sensob sees the line"""
-        if self.sensobs.get_value() <= 0.3:
+        if self.sensobs.get_value() <= self.line_threshold:
             self.bbcon.activate_behavior(self)
             self.active_flag = True
 
     def consider_deactivation(self):
         """Deactivates if the sensob doesn't see the line"""
-        if self.sensobs.get_value() > 0.3:
+        if self.sensobs.get_value() > self.line_threshold:
             self.bbcon.deactivate_behavior(self)
             self.active_flag = False
 
     def sense_and_act(self):
         """Sets motor recommendations to turn away from the line. Updates match_degree"""
         self.match_degree = (1 - self.sensobs.get_value())
-        print("*******IR: ", self.sensobs.get_value())
 
 
 class CollisionDetectionBehaviour(Behavior):
     """Detects an obstacle and halts the robot. OBS: Halt_request is always True"""
+    distance_threshold = 6  # Tweak, distance in cm at or below which the robot stops
+    predict_contact = True  # Tweak, also stop if the distance will be at or below the threshold by the next sample
     def __init__(self, bbcon):
         super(CollisionDetectionBehaviour, self).__init__(bbcon)
         self.sensobs = DISTANCE_SENSOB
@@ -120,16 +142,20 @@ class CollisionDetectionBehaviour(Behavior):
 
     def consider_deactivation(self):
         """deactivates if no obstacles"""
-        if self.sensobs.get_value() > 6:
+        if self.sensobs.get_value() > self.distance_threshold and not self.contact_predicted():
             self.bbcon.deactivate_behavior(self)
             self.active_flag = False
 
     def consider_activation(self):
-        """Activates if obstacle"""
-        if self.sensobs.get_value() <= 6:
+        """Activates if obstacle, or if the robot is predicted to hit one soon"""
+        if self.sensobs.get_value() <= self.distance_threshold or self.contact_predicted():
             self.bbcon.activate_behavior(self)
             self.active_flag = True
 
+    def contact_predicted(self):
+        """Returns True if the tracked distance will be at or below distance_threshold by the next distance sample"""
+        return self.predict_contact and self.sensobs.contact_within(self.distance_threshold)
+
     def sense_and_act(self):
         """Updates match_degree based on proximity"""
         self.match_degree = self.sensobs.get_value()
@@ -138,6 +164,8 @@ class CollisionDetectionBehaviour(Behavior):
 class AvoidObstacleBehaviour(Behavior):
     """Activates if the robot got halted by CollisionDetectionBehaviour.
     Tries to avoid the obstacle"""
+    distance_scale = 50  # Tweak, distance in cm that gives match_degree 1
+    turn_distance = None  # Tweak, distance in cm; turn away early if the distance will be down to it by the next sample
     def __init__(self, bbcon):
         super(AvoidObstacleBehaviour, self).__init__(bbcon)
         self.sensobs = DISTANCE_SENSOB
@@ -148,26 +176,34 @@ class AvoidObstacleBehaviour(Behavior):
 
     def consider_deactivation(self):
         """Deactivates if robot no longer halted (will need a var in CTRL for this)"""
-        if len(self.bbcon.motor_recs) != 1:
+        if len(self.bbcon.motor_recs) != 1 and not self.contact_predicted():
             self.bbcon.deactivate_behavior(self)
             self.active_flag = False
 
     def consider_activation(self):
-        """Activates if robot was halted (will need a var in CTRL for this)"""
-        if len(self.bbcon.motor_recs) == 1:
+        """Activates if robot was halted (will need a var in CTRL for this), or is predicted to hit an obstacle"""
+        if len(self.bbcon.motor_recs) == 1 or self.contact_predicted():
             self.bbcon.activate_behavior(self)
             self.active_flag = True
 
+    def contact_predicted(self):
+        """Returns True if the tracked distance will be down to turn_distance by the next distance sample.
+        Always False for turn_distance None"""
+        return self.turn_distance is not None and self.sensobs.contact_within(self.turn_distance)
+
     def sense_and_act(self):
         """Turns away from obstacle. Updates match_degree based on proximity"""
-        self.match_degree = self.sensobs.get_value() / 50
+        self.match_degree = self.sensobs.get_value() / self.distance_scale
 
 
 class AttackBehaviour(Behavior):
     """Crashes into the obstacle if it's red"""
+    green_threshold = 0.1  # Tweak, fraction of green pixels needed to attack
+    prefetch_distance = 20  # Tweak, distance in cm to an obstacle at which the camera starts prefetching
     def __init__(self, bbcon):
         super(AttackBehaviour, self).__init__(bbcon)
         self.sensobs = CAMERA_SENSOB
+        self.distance_sensob = DISTANCE_SENSOB  # Only read to decide when to prefetch pictures
         self.priority = 100  # Tweak, Must be high
         self.update_weight()
         self.motor_recs = ["F", 1.0]
@@ -186,6 +222,21 @@ class AttackBehaviour(Behavior):
             self.sense_and_act()
             self.update_weight()
 
+    def needed_sensobs(self):
+        """The camera is only looked at while the robot is halted: by consider_activation, and by sense_and_act
+        when the behavior is or becomes active. Otherwise it deactivates or stays inactive without a picture"""
+        if len(self.bbcon.motor_recs) == 1:
+            return [self.sensobs]
+        return []
+
+    def upcoming_sensobs(self):
+        """The camera will be needed when the robot halts in front of an obstacle, so start taking pictures
+        while one is approaching"""
+        distance = self.distance_sensob.get_value()
+        if distance is not None and distance <= self.prefetch_distance:
+            return [self.sensobs]
+        return []
+
     def consider_deactivation(self):
         """Deactivates if the robot is no longer halted"""
         if len(self.bbcon.motor_recs) != 1:
@@ -194,10 +245,9 @@ class AttackBehaviour(Behavior):
 
     def consider_activation(self):
         """Activates if robot was halted AND the sensobs report X amount of green"""
-        if len(self.bbcon.motor_recs) == 1 and self.sensobs.get_value() >= 0.1:
+        if len(self.bbcon.motor_recs) == 1 and self.sensobs.green_at_least(self.green_threshold):
             self.bbcon.activate_behavior(self)
             self.active_flag = True
-            print("******Attack, cam_value: ", self.sensobs.get_value())
 
     def sense_and_act(self):
         """Rams into the obstacle. Match_degree based on amount of Green"""
@@ -0,0 +1,122 @@
+"""Behaviors defined declaratively as rows of a table, evaluated for all rows at once with NumPy.
+A row is a dictionary:
+    name: name of the behavior
+    sensob: the sensob whose value (get_value()) the behavior looks at
+    when: 'below' to be active while the value is at or below `on`, 'above' while it is at or above `on`
+    on: threshold that activates the behavior
+    off: threshold that deactivates it again, for hysteresis (default `on`). For 'below' the behavior deactivates
+        when the value is above `off`, for 'above' when it is below `off`
+    gain, offset: match_degree = gain * value + offset (default 1 and 0)
+    priority: as Behavior.priority (default 1)
+    motor_recs: as Behavior.motor_recs
+    halt_request: as Behavior.halt_request (default False)
+Like Behavior.update, the activation of a row is only reconsidered in the direction it can change, and
+match_degree and weight are computed every timestep whether or not the row is active"""
+import numpy as np
+import behavior
+
+ROW_KEYS = {'name', 'sensob', 'when', 'on', 'off', 'gain', 'offset', 'priority', 'motor_recs', 'halt_request'}
+
+# AvoidLineBehaviour and CollisionDetectionBehaviour written as rows
+EXAMPLE_ROWS = [
+    {'name': 'AvoidLine', 'sensob': behavior.IR_SENSOB, 'when': 'below', 'on': 0.3,
+     'gain': -1.0, 'offset': 1.0, 'priority': 4, 'motor_recs': ["L", 0.5]},
+    {'name': 'CollisionDetection', 'sensob': behavior.DISTANCE_SENSOB, 'when': 'below', 'on': 6,
+     'priority': 5, 'motor_recs': ["S"]},
+]
+
+
+class TableBehavior(behavior.Behavior):
+    """One row of a BehaviorTable. Its state lives in the arrays of the table, which updates it"""
+
+    def __init__(self, bbcon, table, row, definition):
+        super(TableBehavior, self).__init__(bbcon)
+        self.table = table
+        self.row = row
+        self.name = definition['name']
+        self.sensobs = definition['sensob']
+        self.motor_recs = definition['motor_recs']
+        self.halt_request = definition.get('halt_request', False)
+        self.priority = definition.get('priority', 1)
+
+    def update(self):
+        """Does nothing, the table updates all its rows at once"""
+
+    def get_weight(self):
+        """Returns the weight of the row, kept by the table"""
+        return float(self.table.weights[self.row])
+
+    def get_name(self):
+        """Returns the name of the row"""
+        return self.name
+
+
+class BehaviorTable:
+    """Compiles rows into arrays, and updates activation, match_degree and weight of every row in one pass"""
+
+    def __init__(self, bbcon, rows):
+        self.bbcon = bbcon
+        for definition in rows:
+            unknown = set(definition) - ROW_KEYS
+            if unknown:
+                raise ValueError('Unknown keys in behavior row: ' + ', '.join(sorted(unknown)))
+            if definition.get('when', 'below') not in ('below', 'above'):
+                raise ValueError("'when' must be 'below' or 'above' in behavior row " + definition['name'])
+        self.behaviors = [TableBehavior(bbcon, self, row, definition) for row, definition in enumerate(rows)]
+        self.sensobs = []  # Distinct sensobs, each read once per timestep
+        sensob_index = []
+        for definition in rows:
+            if definition['sensob'] not in self.sensobs:
+                self.sensobs.append(definition['sensob'])
+            sensob_index.append(self.sensobs.index(definition['sensob']))
+        self.sensob_index = np.array(sensob_index, dtype=np.intp)
+        # 'above' rows are evaluated as 'below' rows on the negated value
+        self.sign = np.array([-1.0 if definition.get('when') == 'above' else 1.0 for definition in rows])
+        self.on = self.sign * np.array([definition['on'] for definition in rows], dtype=float)
+        self.off = self.sign * np.array([definition.get('off', definition['on']) for definition in rows], dtype=float)
+        self.gain = np.array([definition.get('gain', 1.0) for definition in rows], dtype=float)
+        self.offset = np.array([definition.get('offset', 0.0) for definition in rows], dtype=float)
+        self.priority = np.array([definition.get('priority', 1) for definition in rows], dtype=float)
+        self.active = np.zeros(len(rows), dtype=bool)
+        self.match_degrees = np.zeros(len(rows))
+        self.weights = np.zeros(len(rows))
+
+    def get_behaviors(self):
+        """Returns the TableBehavior of every row, to be added to the controller"""
+        return self.behaviors
+
+    def needed_sensobs(self):
+        """Returns the sensobs of all rows, which are read every timestep"""
+        return self.sensobs
+
+    def sensob_values(self):
+        """Returns the current value of every distinct sensob, nan where there is no sample"""
+        return np.array([np.nan if this_sensob.value is None else this_sensob.get_value()
+                         for this_sensob in self.sensobs], dtype=float)
+
+    def update(self):
+        """Updates every row from the current sensob values, and tells the controller and the arbitrator about
+        the rows whose activation or weight changed. The weights stay in the table's array (see
+        TableBehavior.get_weight), and the arbitrator gets the changed ones in one call"""
+        values = self.sensob_values()[self.sensob_index]
+        signed = self.sign * values
+        # Comparisons with nan are False, so rows without a sample keep their activation
+        active = np.where(self.active, ~(signed > self.off), signed <= self.on)
+        self.match_degrees = self.gain * values + self.offset
+        weights = np.nan_to_num(self.priority * self.match_degrees)
+        changed_activation = np.flatnonzero(active != self.active)
+        changed_weight = np.flatnonzero(weights != self.weights)
+        self.active = active
+        self.weights = weights
+        activated = []
+        deactivated = []
+        for row in changed_activation:
+            this_behavior = self.behaviors[row]
+            this_behavior.active_flag = bool(active[row])
+            (activated if this_behavior.active_flag else deactivated).append(this_behavior)
+        if activated:
+            self.bbcon.activate_behaviors(activated)
+        if deactivated:
+            self.bbcon.deactivate_behaviors(deactivated)
+        if len(changed_weight):
+            self.bbcon.arbitrator.weights_changed([self.behaviors[row] for row in changed_weight])
@@ -0,0 +1,247 @@
+"""Benchmarks of the hot paths of the controller, run against the simulated backend so they work on any Linux box.
+
+    python benchmark.py [-o results.json] [-f filter]    run the benchmarks, optionally saving the results
+    python benchmark.py --compare old.json new.json      compare two saved runs
+
+The results are JSON: one entry per benchmark with the min, median and max per-call time, plus the commit and platform"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import types
+import backend
+import simulator
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """Times func. Returns the per-call times (seconds) of `repeat` runs of about min_time each"""
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time / repeat and number < 10 ** 7:
+        number *= 2
+    return [total / number for total in timer.repeat(repeat, number)]
+
+
+def summarize(name, times, **params):
+    """Returns the result entry of one benchmark"""
+    times = sorted(times)
+    return {'name': name, 'params': params, 'min': times[0], 'median': times[len(times) // 2],
+            'max': times[-1], 'calls_per_second': 1 / times[len(times) // 2]}
+
+
+def camera_frame(width, height):
+    """Returns a simulated camera frame, looking at the target"""
+    world = simulator.World(x=80, y=40)
+    return world.render(width, height)
+
+
+def bench_camera():
+    """CameraSensob.get_value on frames of increasing size"""
+    import behavior
+    sensob = behavior.CAMERA_SENSOB
+    results = []
+    for width, height in [(128, 96), (320, 240), (640, 480)]:
+        frame = camera_frame(width, height)
+
+        def get_value():
+            sensob.set_value(frame)
+            sensob.get_value()
+        results.append(summarize('camera_get_value', measure(get_value), width=width, height=height))
+
+        def green_at_least():
+            sensob.set_value(frame)
+            sensob.green_at_least(0.1)
+        sensob.estimate = True
+        results.append(summarize('camera_green_at_least_estimate', measure(green_at_least), width=width, height=height))
+        sensob.estimate = False
+    return results
+
+
+def bench_frame_stream():
+    """Latency from a frame being written by the fake camera producer to FrameStream returning it"""
+    import frame_stream
+    results = []
+    for width, height in [(128, 96), (640, 480)]:
+        stream = frame_stream.FrameStream(frame_stream.fake_command(width, height, 30), width, height)
+        results.append(summarize('frame_stream_latency', frame_stream.measure_latency(stream, 30),
+                                 width=width, height=height))
+        stream.close()
+    return results
+
+
+def bench_reflectance():
+    """ReflectanceSensors.compute_value (six simulated discharges) and normalize"""
+    import behavior
+    sensors = behavior.IR_SENSOB.sensors
+    return [summarize('reflectance_compute_value', measure(sensors.compute_value)),
+            summarize('reflectance_normalize', measure(lambda: sensors.normalize(3, 500)))]
+
+
+def bench_arbitrator():
+    """Both arbitrator modes, and every IndexedArbitrator mode, with many active behaviors"""
+    import arbitrator
+    import behavior
+    results = []
+    for count in [5, 50, 500]:
+        fake_bbcon = types.SimpleNamespace(active_behaviors=[])
+        for i in range(count):
+            this_behavior = behavior.Behavior(fake_bbcon)
+            this_behavior.motor_recs = ['F', 0.5]
+            this_behavior.weight = 0.5 + i % 7
+            fake_bbcon.active_behaviors.append(this_behavior)
+        for deterministic in [True, False]:
+            this_arbitrator = arbitrator.Arbitrator(fake_bbcon, deterministic)
+            mode = 'deterministic' if deterministic else 'stochastic'
+            results.append(summarize('arbitrator_choose_action', measure(this_arbitrator.choose_action),
+                                     mode=mode, behaviors=count))
+        for mode in arbitrator.IndexedArbitrator.MODES:
+            this_arbitrator = arbitrator.IndexedArbitrator(fake_bbcon, mode, seed=0)
+            for this_behavior in fake_bbcon.active_behaviors:
+                this_arbitrator.behavior_activated(this_behavior)
+            results.append(summarize('indexed_arbitrator_choose_action', measure(this_arbitrator.choose_action),
+                                     mode=mode, behaviors=count))
+            changing = fake_bbcon.active_behaviors[count // 2]
+
+            def weight_changed():
+                changing.weight = 7.5 - changing.weight
+                this_arbitrator.weight_changed(changing)
+            results.append(summarize('indexed_arbitrator_weight_changed', measure(weight_changed, repeat=3),
+                                     mode=mode, behaviors=count))
+    return results
+
+
+def bench_behavior_table():
+    """BehaviorTable.update with many rows, against updating as many hand-coded behaviors"""
+    import arbitrator
+    import behavior
+    import behavior_table
+    results = []
+    for count in [5, 50, 500]:
+        fake_bbcon = types.SimpleNamespace(active_behaviors=[], activate_behavior=lambda b: None,
+                                           deactivate_behavior=lambda b: None, activate_behaviors=lambda b: None,
+                                           deactivate_behaviors=lambda b: None)
+        fake_bbcon.arbitrator = arbitrator.Arbitrator(fake_bbcon, True)
+        rows = [{'name': 'Line' + str(i), 'sensob': behavior.IR_SENSOB, 'when': 'below', 'on': 0.1 * (i % 10),
+                 'gain': -1.0, 'offset': 1.0, 'priority': 1 + i % 5, 'motor_recs': ["L", 0.5]} for i in range(count)]
+        table = behavior_table.BehaviorTable(fake_bbcon, rows)
+        coded = [behavior.AvoidLineBehaviour(fake_bbcon) for _ in range(count)]
+
+        def update_coded():
+            for this_behavior in coded:
+                this_behavior.update()
+        behavior.IR_SENSOB.update()
+        results.append(summarize('behavior_table_update', measure(table.update), behaviors=count))
+        results.append(summarize('behavior_update', measure(update_coded), behaviors=count))
+    return results
+
+
+def bench_motob():
+    """Motob.operationalize dispatch for every kind of motor recommendation"""
+    import motob
+    this_motob = motob.Motob()
+    results = []
+    for recommendation in [['F', 0.5], ['B', 0.5], ['L', 0.5], ['R', 0.5], ['S']]:
+        def operationalize():
+            this_motob.value = recommendation
+            this_motob.operationalize()
+        results.append(summarize('motob_operationalize', measure(operationalize), recommendation=recommendation[0]))
+    return results
+
+
+def bench_bbcon():
+    """Full timesteps of the controller in the simulator"""
+    import bbcon
+    controller = bbcon.Bbcon()
+    return [summarize('bbcon_run_one_timestep', measure(controller.run_one_timestep))]
+
+
+def bench_imager():
+    """The imager2 pixel operations"""
+    import imager2
+    results = []
+    for size in [64, 128]:
+        im1 = imager2.Imager(image=camera_frame(size, size))
+        im2 = imager2.Imager(image=camera_frame(size, size).transpose(0))
+        results.append(summarize('imager_map_image2', measure(lambda: im1.map_image2(lambda p: p[::-1])), size=size))
+        results.append(summarize('imager_map_color_wta', measure(im1.map_color_wta), size=size))
+        results.append(summarize('imager_morph', measure(lambda: im1.morph(im2)), size=size))
+        results.append(summarize('imager_tunnel', measure(lambda: imager2.Imager(image=im1.image.copy()).tunnel(3)),
+                                 size=size))
+        results.append(summarize('imager_concat_horiz', measure(lambda: im1.concat_horiz(im2)), size=size))
+
+        def concat_panorama():
+            panorama = im1
+            for _ in range(29):
+                panorama = panorama.concat_horiz(im2)
+
+        def build_panorama():
+            builder = imager2.PanoramaBuilder()
+            for _ in range(30):
+                builder.add(im1)
+            builder.get_imager()
+        results.append(summarize('imager_panorama_concat', measure(concat_panorama), size=size, shots=30))
+        results.append(summarize('imager_panorama_builder', measure(build_panorama), size=size, shots=30))
+    return results
+
+
+BENCHMARKS = [bench_camera, bench_frame_stream, bench_reflectance, bench_arbitrator, bench_behavior_table, bench_motob,
+              bench_bbcon, bench_imager]
+
+
+def run(name_filter=None):
+    """Runs the benchmarks whose name contains name_filter, and returns the results"""
+    backend.use('sim')
+    results = []
+    for bench in BENCHMARKS:
+        if name_filter and name_filter not in bench.__name__:
+            continue
+        for result in bench():
+            print('{:<36}{:<45}{:>12.1f} us'.format(result['name'], json.dumps(result['params']),
+                                                   1e6 * result['median']))
+            results.append(result)
+    return {'commit': git_commit(), 'python': platform.python_version(), 'machine': platform.machine(),
+            'results': results}
+
+
+def git_commit():
+    """Returns the current commit hash, None outside a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """Prints the median time of every benchmark in two result files, and the speedup"""
+    with open(old_path) as file:
+        old = {(r['name'], json.dumps(r['params'])): r for r in json.load(file)['results']}
+    with open(new_path) as file:
+        new = json.load(file)['results']
+    for result in new:
+        key = (result['name'], json.dumps(result['params']))
+        if key in old:
+            print('{:<36}{:<45}{:>12.1f} us{:>12.1f} us{:>9.2f}x'.format(
+                key[0], key[1], 1e6 * old[key]['median'], 1e6 * result['median'],
+                old[key]['median'] / result['median']))
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Benchmarks of the controller hot paths')
+    parser.add_argument('-o', '--output', help='file the JSON results are written to')
+    parser.add_argument('-f', '--filter', help='only run the benchmark functions whose name contains this')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args.filter)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
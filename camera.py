@@ -1,14 +1,15 @@
-import os
-from PIL import Image
+import backend
 
 
 class Camera():
 
-    def __init__(self, img_width=128, img_height=96, img_rot=0):
+    def __init__(self, img_width=128, img_height=96, img_rot=0, streaming=False):
         self.value = None
         self.img_width = img_width
         self.img_height = img_height
         self.img_rot = img_rot
+        self.streaming = streaming  # Read frames from a camera stream instead of taking single pictures
+        self.stream = None  # Started at the first update when streaming
 
     def get_value(self):  return self.value
 
@@ -20,11 +21,21 @@ class Camera():
         self.value = None
 
     def sensor_get_value(self):
-        # This is a OS call that takes a image and makes it accessible to PIL operations in the same directory
-        os.system('raspistill -t 1 -o image.png -w "' + str(self.img_width) + '" -h "' + str(self.img_height) + '" -rot "' + str(self.img_rot) + '"')
-        # Open the image just taken by raspicam
+        # Takes a picture with the backend camera (raspistill on the robot)
+        # or gets the latest frame from the camera stream (raspividyuv on the robot)
         # Stores the RGB array in the value field
-        self.value = Image.open('image.png').convert('RGB')
+        if self.streaming:
+            if self.stream is None:
+                self.stream = backend.open_stream(self.img_width, self.img_height, self.img_rot)
+            self.value = self.stream.get_frame()
+        else:
+            self.value = backend.capture(self.img_width, self.img_height, self.img_rot)
+
+    def close(self):
+        """Stops the camera stream, if there is one"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
 
 # Just testing the camera in python
 
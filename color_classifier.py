@@ -0,0 +1,121 @@
+"""Classification of the pixels of a camera picture into named colors, on the whole frame buffer at once with NumPy.
+A color is a box of channel thresholds in RGB or HSV (PIL's HSV, where every channel is 0-255).
+When only the side of a threshold the fraction of a color is on matters, ColorClassifier.estimate decides it from
+a random sample of the pixels instead"""
+import math
+import numpy as np
+from PIL import Image
+
+SPACES = ('RGB', 'HSV')
+
+
+class ColorRule:
+    """A named color: the pixels whose channels are all within [low, high] (inclusive) in the color space.
+    In HSV a hue range with low > high wraps around, e.g. (240, 15) for red"""
+
+    def __init__(self, name, low, high, space='RGB'):
+        if space not in SPACES:
+            raise ValueError('Unknown color space: ' + space)
+        self.name = name
+        self.low = np.array(low, dtype=np.uint8)
+        self.high = np.array(high, dtype=np.uint8)
+        self.space = space
+
+    def match(self, pixels):
+        """Returns a boolean mask of the pixels (a height x width x 3 array in the rule's space) of this color"""
+        mask = np.ones(pixels.shape[:2], dtype=bool)
+        for channel in range(3):
+            values = pixels[..., channel]
+            low, high = self.low[channel], self.high[channel]
+            if self.space == 'HSV' and channel == 0 and low > high:
+                mask &= (values >= low) | (values <= high)
+            else:
+                mask &= (values >= low) & (values <= high)
+        return mask
+
+
+# The thresholds CameraSensob always used: R <= 150, G >= 150, B <= 150
+GREEN = ColorRule('green', (0, 150, 0), (150, 255, 150))
+RED = ColorRule('red', (240, 100, 80), (15, 255, 255), 'HSV')
+BLUE = ColorRule('blue', (135, 100, 60), (185, 255, 255), 'HSV')
+
+
+class ColorClassifier:
+    """Counts the pixels of every rule in a picture. The picture is converted to each color space the rules use
+    once, and every rule is evaluated on the whole (region of the) frame in one vectorized operation.
+    roi: region of interest (left, top, right, bottom) as fractions of the width and height, None for the whole
+    picture"""
+
+    def __init__(self, rules, roi=None, seed=None):
+        """seed: seed of the random pixel sampling of estimate()"""
+        self.rules = list(rules)
+        self.roi = roi
+        self.rng = np.random.default_rng(seed)
+
+    def get_rule(self, name):
+        """Returns the rule of the color with the given name"""
+        for rule in self.rules:
+            if rule.name == name:
+                return rule
+        raise KeyError(name)
+
+    def crop(self, image):
+        """Returns the region of interest of a PIL image"""
+        if self.roi is None:
+            return image
+        width, height = image.size
+        left, top, right, bottom = self.roi
+        return image.crop((round(left * width), round(top * height), round(right * width), round(bottom * height)))
+
+    def pixels(self, image):
+        """Returns the region of interest as an array in every color space used by the rules"""
+        image = self.crop(image).convert('RGB')
+        return {space: np.asarray(image if space == 'RGB' else image.convert(space))
+                for space in SPACES if any(rule.space == space for rule in self.rules)}
+
+    def masks(self, image):
+        """Returns {color name: boolean mask of its pixels} for a PIL image"""
+        pixels = self.pixels(image)
+        return {rule.name: rule.match(pixels[rule.space]) for rule in self.rules}
+
+    def fractions(self, image):
+        """Returns {color name: fraction of the pixels in the region of interest that have the color}"""
+        return {name: float(mask.mean()) if mask.size else 0.0 for name, mask in self.masks(image).items()}
+
+    def estimate(self, image, name, threshold, delta=0.01, batch=256, max_samples=4096):
+        """Decides whether the fraction of pixels of a color is at least threshold, from pixels drawn at random
+        in batches. Sampling stops as soon as the Hoeffding bound puts the threshold outside the confidence interval.
+        The interval is checked after every batch, so each check gets delta divided by the number of checks
+        (a union bound): the decision is wrong with probability at most delta. If no check has decided after
+        max_samples, or the picture has fewer pixels than that, the pixels are counted exactly.
+        Returns a FractionEstimate"""
+        rule = self.get_rule(name)
+        region = self.crop(image)
+        pixels = np.asarray(region if region.mode == 'RGB' else region.convert('RGB')).reshape(-1, 3)
+        total = len(pixels)
+        looks = max(1, min(max_samples, total) // batch)
+        hits = samples = 0
+        while samples + batch <= min(max_samples, total):
+            sample = pixels[self.rng.integers(total, size=batch)].reshape(1, batch, 3)
+            if rule.space != 'RGB':
+                sample = np.asarray(Image.fromarray(sample).convert(rule.space))
+            hits += int(rule.match(sample).sum())
+            samples += batch
+            fraction = hits / samples
+            error = math.sqrt(math.log(2 * looks / delta) / (2 * samples))
+            if abs(fraction - threshold) > error:
+                return FractionEstimate(fraction, error, samples, threshold)
+        return FractionEstimate(self.fractions(image)[name], 0.0, total, threshold)
+
+
+class FractionEstimate:
+    """Result of ColorClassifier.estimate. fraction: estimated fraction of the pixels that have the color,
+    error: half width of the confidence interval around it (0 when exact), samples: pixels looked at,
+    exceeds: True if the fraction is at least the threshold"""
+
+    def __init__(self, fraction, error, samples, threshold):
+        self.fraction = fraction
+        self.error = error
+        self.samples = samples
+        self.exact = error == 0.0
+        self.exceeds = fraction >= threshold
@@ -0,0 +1,54 @@
+"""Timing of GPIO edges with edge-event callbacks (GPIO.add_event_detect) instead of polling loops.
+The callbacks record the backend.monotonic_ns() time of every edge, and the caller sleeps until the measurement
+is complete or times out, so no core is burnt spinning on GPIO.input"""
+import threading
+import backend
+from backend import GPIO
+
+
+class EdgeTimer:
+    """Records the times of the edges on some input pins while armed.
+    edge: GPIO.RISING, GPIO.FALLING or GPIO.BOTH"""
+
+    def __init__(self, pins, edge):
+        self.pins = list(pins)
+        self.edge = edge
+        self.condition = threading.Condition()
+        self.edges = {pin: [] for pin in self.pins}  # Pin -> edge times in ns, in order
+
+    def arm(self):
+        """Starts recording edges. The pins must be set up as inputs"""
+        with self.condition:
+            self.edges = {pin: [] for pin in self.pins}
+        for pin in self.pins:
+            GPIO.add_event_detect(pin, self.edge, callback=self.on_edge)
+
+    def disarm(self):
+        """Stops recording edges"""
+        for pin in self.pins:
+            GPIO.remove_event_detect(pin)
+
+    def record_missed(self, level):
+        """Records the current time as the edge of the pins that are at level already but have no edge recorded.
+        Their edge came before arm(), which on the robot can only be done once a pin is an input"""
+        now = backend.monotonic_ns()
+        with self.condition:
+            for pin in self.pins:
+                if not self.edges[pin] and GPIO.input(pin) == level:
+                    self.edges[pin].append(now)
+            self.condition.notify_all()
+
+    def on_edge(self, channel):
+        """GPIO callback, run in the GPIO event thread on the robot"""
+        now = backend.monotonic_ns()
+        with self.condition:
+            self.edges[channel].append(now)
+            self.condition.notify_all()
+
+    def wait(self, count, timeout, pins=None):
+        """Waits until each of the pins (all by default) has had count edges, at most timeout seconds.
+        Returns {pin: edge times in ns}, with fewer than count times for the pins that timed out"""
+        pins = pins if pins is not None else self.pins
+        backend.wait_for(self.condition, lambda: all(len(self.edges[pin]) >= count for pin in pins), timeout)
+        with self.condition:
+            return {pin: list(self.edges[pin]) for pin in pins}
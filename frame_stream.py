@@ -0,0 +1,153 @@
+"""Streaming camera capture. A long-lived capture process writes raw RGB frames to a pipe, a reader thread keeps
+the latest complete frame, and get_frame() returns it without starting a process or touching the disk.
+On the robot the producer is raspividyuv. The fake producer in this module draws synthetic frames instead:
+
+    python frame_stream.py fake <width> <height> <fps>      write fake frames to stdout
+    python frame_stream.py latency [width] [height] [fps]   measure the frame latency of the fake producer
+
+Fake frames carry the time.monotonic() they were produced at in their first 8 bytes, for measure_latency()"""
+import struct
+import subprocess
+import sys
+import threading
+import time
+from PIL import Image
+
+STAMP = struct.Struct('<d')
+
+
+def raspividyuv_command(width, height, fps=30):
+    """Command line of raspividyuv streaming RGB frames to stdout until it is killed"""
+    return ['raspividyuv', '-w', str(width), '-h', str(height), '-fps', str(fps), '--rgb', '-t', '0', '-n', '-o', '-']
+
+
+def padded_size(width, height):
+    """raspividyuv pads the rows of its frames to multiples of 32 pixels, and the frames to multiples of 16 rows"""
+    return (width + 31) // 32 * 32, (height + 15) // 16 * 16
+
+
+def fake_command(width, height, fps=30):
+    """Command line of the fake producer in this module"""
+    return [sys.executable, __file__, 'fake', str(width), str(height), str(fps)]
+
+
+class FrameStream:
+    """Reads raw RGB frames of a known size from the stdout of a capture process.
+    padded: (width, height) of the frames as the process writes them, when larger than the picture"""
+
+    def __init__(self, command, width, height, padded=None, rot=0):
+        self.width = width
+        self.height = height
+        self.padded = padded if padded else (width, height)
+        self.rot = rot
+        self.frame_size = self.padded[0] * self.padded[1] * 3
+        self.frame = None  # Latest complete frame as bytes
+        self.frame_time = None  # time.monotonic() when it was read
+        self.frames_read = 0
+        self.condition = threading.Condition()
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                                        bufsize=self.frame_size)
+        self.reader = threading.Thread(target=self.read_frames, daemon=True)
+        self.reader.start()
+
+    def read_frames(self):
+        """Reader thread: reads frames as fast as the process writes them, so the pipe never fills up"""
+        stdout = self.process.stdout
+        while True:
+            buffer = bytearray(self.frame_size)
+            view = memoryview(buffer)
+            filled = 0
+            while filled < self.frame_size:
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    with self.condition:
+                        self.condition.notify_all()
+                    return
+                filled += count
+            with self.condition:
+                self.frame = buffer
+                self.frame_time = time.monotonic()
+                self.frames_read += 1
+                self.condition.notify_all()
+
+    def get_frame_bytes(self, newer_than=0, timeout=5.0):
+        """Returns (frame number, raw frame) of the latest complete frame, waiting until there is a frame numbered
+        above newer_than. Raises OSError if the capture process ends or no frame arrives in time"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frames_read > newer_than or not self.reader.is_alive(),
+                                           timeout):
+                raise OSError('No camera frame within {} s'.format(timeout))
+            if self.frames_read <= newer_than:
+                raise OSError('Camera stream ended')
+            return self.frames_read, self.frame
+
+    def get_frame(self, newer_than=0, timeout=5.0):
+        """Returns the latest complete frame as an RGB PIL image (see get_frame_bytes)"""
+        frame = self.get_frame_bytes(newer_than, timeout)[1]
+        image = Image.frombuffer('RGB', self.padded, bytes(frame), 'raw', 'RGB', 0, 1)
+        if self.padded != (self.width, self.height):
+            image = image.crop((0, 0, self.width, self.height))
+        return image.rotate(self.rot, expand=True) if self.rot else image
+
+    def close(self):
+        """Stops the capture process"""
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+        self.reader.join()
+
+
+def fake_frame(width, height, number):
+    """A gray frame with a green bar that moves one column per frame"""
+    row = bytearray(b'\x5a\x5a\x5a' * width)
+    column = number % width
+    for x in range(column, min(width, column + max(1, width // 8))):
+        row[3 * x:3 * x + 3] = b'\x1e\xb4\x28'
+    return bytearray(bytes(row) * height)
+
+
+def run_fake(width, height, fps):
+    """Fake producer: writes stamped frames to stdout at fps until the reader goes away"""
+    out = sys.stdout.buffer
+    period = 1.0 / fps
+    deadline = time.monotonic()
+    number = 0
+    try:
+        while True:
+            frame = fake_frame(width, height, number)
+            STAMP.pack_into(frame, 0, time.monotonic())
+            out.write(frame)
+            out.flush()
+            number += 1
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+
+
+def measure_latency(stream, frames=50):
+    """Returns the latencies in seconds from a fake frame being produced to get_frame_bytes returning it"""
+    latencies = []
+    number = 0
+    for _ in range(frames):
+        number, frame = stream.get_frame_bytes(number)
+        latencies.append(time.monotonic() - STAMP.unpack_from(frame)[0])
+    return latencies
+
+
+def main(argv):
+    """Command line entry point"""
+    if argv[0] == 'fake':
+        run_fake(int(argv[1]), int(argv[2]), float(argv[3]))
+    elif argv[0] == 'latency':
+        width, height, fps = (int(argv[1]), int(argv[2]), float(argv[3])) if len(argv) > 3 else (128, 96, 30)
+        stream = FrameStream(fake_command(width, height, fps), width, height)
+        latencies = sorted(measure_latency(stream))
+        stream.close()
+        print('Frame latency: median {:.2f} ms, max {:.2f} ms'.format(1e3 * latencies[len(latencies) // 2],
+                                                                       1e3 * latencies[-1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
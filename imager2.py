@@ -1,3 +1,8 @@
+import glob
+import multiprocessing
+import os
+import time
+import numpy as np
 from PIL import Image
 from PIL import ImageFilter
 from PIL import ImageEnhance
@@ -29,9 +34,9 @@ class Imager():
     # Save image to a file.  Only if fid has no extension is the type argument used.  When writing to a JPEF
     # file, use the extension JPEG, not JPG, which seems to cause some problems.
     def dump_image(self,fid,type='gif'):
-        fname = fid.split('.')
-        type = fname[1] if len(fname) > 1 else type
-        self.image.save(fname[0]+'.'+type,format=type)
+        base, extension = os.path.splitext(fid) # Only the last dot, so directories may contain dots
+        type = extension[1:] if extension else type
+        self.image.save(base+'.'+type,format=type)
 
     def get_image(self): return self.image
     def set_image(self,im): self.image = im
@@ -52,13 +57,14 @@ class Imager():
 
     def get_color_rgb(self,colorname): return Imager._pixel_colors_[colorname]
 
-    # This returns a resized copy of the image
-    def resize(self,new_width,new_height,image=False):
+    # This returns a resized copy of the image.  resample is a PIL filter, e.g. Image.NEAREST; None for PIL's default
+    def resize(self,new_width,new_height,image=False,resample=None):
         image = image if image else self.image
-        return Imager(image=image.resize((new_width,new_height)))
+        if resample is None: return Imager(image=image.resize((new_width,new_height)))
+        return Imager(image=image.resize((new_width,new_height),resample))
 
-    def scale(self,xfactor,yfactor):
-        return self.resize(round(xfactor*self.xmax),round(yfactor*self.ymax))
+    def scale(self,xfactor,yfactor,resample=None):
+        return self.resize(round(xfactor*self.xmax),round(yfactor*self.ymax),resample=resample)
 
     def get_pixel(self,x,y): return self.image.getpixel((x,y))
     def set_pixel(self,x,y,rgb): self.image.putpixel((x,y),rgb)
@@ -74,25 +80,34 @@ class Imager():
 
     # This applies the function to each RGB TUPLE, returning a new tuple to appear in the new image.  So func
     # must return a 3-tuple if the image has RGB pixels.
+    # func is called once per distinct pixel value, and the results are looked up for all pixels at once.
 
     def map_image2(self,func,image=False):
-        im2 = image.copy() if image else self.image.copy()
-        for i in range(self.xmax):
-            for j in range(self.ymax):
-                im2.putpixel((i,j),func(im2.getpixel((i,j))))
-        return Imager(image = im2)
+        image = image if image else self.image
+        pixels = np.asarray(image)
+        if pixels.ndim == 2: # One band: func gets and returns an int
+            keys = pixels.reshape(-1)
+            values, inverse = np.unique(keys, return_inverse=True)
+            mapped = np.array([func(int(v)) for v in values], dtype=pixels.dtype)
+        else: # Pack the bands of each pixel into one int, so the distinct pixels are found in one pass
+            keys = np.zeros(pixels.shape[0]*pixels.shape[1], dtype=np.uint64)
+            for band in range(pixels.shape[2]):
+                keys |= pixels[..., band].reshape(-1).astype(np.uint64) << np.uint64(8*band)
+            values, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            flat = pixels.reshape(-1, pixels.shape[2])
+            mapped = np.array([func(tuple(int(c) for c in flat[i])) for i in first], dtype=pixels.dtype)
+        return Imager(image=Image.fromarray(mapped[inverse.reshape(-1)].reshape(pixels.shape), image.mode))
 
     # WTA = winner take all: The dominant color becomes the ONLY color in each pixel.  However, the winner must
     # dominate by having at least thresh fraction of the total.
     def map_color_wta(self,image=False,thresh=0.34):
         image = image if image else self.image
-        def wta(p):
-            s = sum(p); w = max(p)
-            if s > 0 and w/s >= thresh:
-                return tuple([(x if x == w else 0) for x in p])
-            else:
-                return (0,0,0)
-        return self.map_image2(wta,image)
+        p = np.asarray(image.convert('RGB'), dtype=np.int64)
+        s = p.sum(axis=2); w = p.max(axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            winner = (s > 0) & (w/s >= thresh)
+        p = np.where(winner[..., None] & (p == w[..., None]), p, 0)
+        return Imager(image=Image.fromarray(p.astype(np.uint8), 'RGB'))
 
 
     # Note that grayscale uses the RGB triple to define shades of gray.
@@ -129,13 +144,12 @@ class Imager():
         return im3
 
     # This requires self and im2 to be of the same size
+    # combine_pixels on all pixels at once.  np.round rounds halves to even, just like round.
     def morph(self,im2,alpha=0.5):
-        im3 = Imager(width=self.xmax,height=self.ymax) # Creates a plain image
-        for x in range(self.xmax):
-            for y in range(self.ymax):
-                rgb = self.combine_pixels(self.get_pixel(x,y), im2.get_pixel(x,y), alpha=alpha)
-                im3.set_pixel(x,y,rgb)
-        return im3
+        p1 = np.asarray(self.image.convert('RGB'), dtype=np.float64)
+        p2 = np.asarray(im2.image.convert('RGB'), dtype=np.float64)[:self.ymax, :self.xmax]
+        rgb = np.round(alpha*p1 + (1 - alpha)*p2)
+        return Imager(image=Image.fromarray(rgb.astype(np.uint8), 'RGB'))
 
     def morph4(self,im2):
         im3 = self.morph(im2,alpha=0.66)
@@ -165,6 +179,174 @@ class Imager():
     def mortun(self,im2,levels=5,scale=0.75):
         return self.tunnel(levels,scale).morph4(im2.tunnel(levels,scale))
 
+
+# Builds a panorama by pasting frames side by side (or on top of each other when vertical) into one canvas, like
+# repeated concat_horiz (concat_vert), but each frame is copied only once.  With the number of frames given, the
+# canvas is allocated at its final size up front.  Otherwise it doubles its length whenever it is full.
+
+class PanoramaBuilder():
+
+    def __init__(self,frames=0,vertical=False,background='black',mode='RGB'):
+        self.frames = frames # Expected number of frames, 0 if unknown
+        self.vertical = vertical
+        self.background = background
+        self.mode = mode
+        self.canvas = None # Imager holding the frames added so far, plus room for more
+        self.length = 0 # Along the panorama: width (height if vertical) used by the frames so far
+        self.breadth = 0 # Across the panorama: height (width if vertical) of the highest (widest) frame
+
+    def along_across(self,size): return (size[1],size[0]) if self.vertical else (size[0],size[1])
+    def size(self,along,across): return (across,along) if self.vertical else (along,across)
+
+    def add(self,im):
+        image = im.get_image() if isinstance(im,Imager) else im
+        along, across = self.along_across(image.size)
+        if self.canvas is None:
+            self.allocate(along*max(self.frames,1),across)
+        else:
+            capacity, breadth = self.along_across(self.canvas.get_image().size)
+            if self.length + along > capacity or across > breadth:
+                self.allocate(max(self.length + along,2*capacity if self.length + along > capacity else capacity),
+                              max(across,breadth))
+        x0, y0 = self.size(self.length,0)
+        self.canvas.get_image().paste(image,(x0,y0))
+        self.length += along
+        self.breadth = max(self.breadth,across)
+        return self
+
+    # (Re)allocates the canvas, keeping the frames added so far
+    def allocate(self,capacity,breadth):
+        width, height = self.size(capacity,breadth)
+        canvas = Imager(width=width,height=height,background=self.background,mode=self.mode)
+        if self.canvas is not None:
+            canvas.get_image().paste(self.canvas.get_image(),(0,0))
+        self.canvas = canvas
+
+    # Returns the panorama as an Imager.  The canvas itself if it is filled exactly, otherwise a cropped copy.
+    def get_imager(self):
+        if self.canvas is None: return Imager(width=0,height=0,background=self.background,mode=self.mode)
+        size = self.size(self.length,self.breadth)
+        if self.canvas.get_image().size == size: return self.canvas
+        return Imager(image=self.canvas.get_image().crop((0,0)+size))
+
+
+# An Imager that records resize, scale, map_image, map_color_wta, scale_colors and gen_grayscale instead of running
+# them, and runs the recorded operations only when the image is needed (get_image, dump_image, display, or any
+# other method).  Adjacent map_image calls are fused into one lookup table, lookup tables and WTA run together in
+# one pass over a single array, and a resize with Image.NEAREST is moved ahead of per-pixel operations, where it
+# picks the same pixels.  The results are identical to those of Imager.
+# Operations are ('lut',table), ('wta',thresh), ('color',degree) and ('resize',width,height,resample).
+
+class LazyImager(Imager):
+
+    _lazy_modes_ = ('L','RGB') # Modes the operations are recorded for, other modes run eagerly
+    _per_pixel_ = ('lut','wta','color')
+
+    def __init__(self,fid=False,image=False,width=100,height=100,background='black',mode='RGB'):
+        self.ops = () # Recorded operations, applied to _image when the image is needed
+        self.shared = False # True if lazy imagers derived from this one still need _image as it is
+        Imager.__init__(self,fid=fid,image=image,width=width,height=height,background=background,mode=mode)
+
+    @property
+    def image(self):
+        if self.ops:
+            self._image = self.run_ops(self._image,self.ops)
+            self.ops = (); self.shared = False
+        return self._image
+
+    @image.setter
+    def image(self,im):
+        self._image = im; self.ops = (); self.shared = False
+
+    # Returns a new LazyImager with one more operation recorded
+    def derive(self,op,width=None,height=None,mode=None):
+        im = LazyImager.__new__(LazyImager)
+        im.fid = False; im._image = self._image; im.ops = self.push(self.ops,op); im.shared = False
+        im.xmax = width if width is not None else self.xmax
+        im.ymax = height if height is not None else self.ymax
+        im.mode = mode if mode else self.mode
+        if not self.ops: self.shared = True
+        return im
+
+    # Appends op to ops, fusing it with the last lookup table or moving a nearest-neighbour resize ahead
+    def push(self,ops,op):
+        if op[0] == 'lut' and ops and ops[-1][0] == 'lut':
+            return ops[:-1] + (('lut',[op[1][v] for v in ops[-1][1]]),)
+        if op[0] == 'resize' and op[3] == Image.NEAREST and ops and ops[-1][0] in LazyImager._per_pixel_:
+            return self.push(ops[:-1],op) + (ops[-1],)
+        return ops + (op,)
+
+    @staticmethod
+    def lut(func): # The table Image.eval uses for func, including its conversion of the results to bytes
+        return list(Image.eval(Image.frombytes('L',(256,1),bytes(range(256))),func).tobytes())
+
+    @staticmethod
+    def run_ops(image,ops):
+        i = 0
+        while i < len(ops):
+            op = ops[i]
+            if op[0] == 'resize':
+                image = image.resize((op[1],op[2])) if op[3] is None else image.resize((op[1],op[2]),op[3])
+            elif op[0] == 'color':
+                image = ImageEnhance.Color(image).enhance(op[1])
+            else: # A run of lookup tables and WTA, done in one pass over one array
+                j = i
+                while j < len(ops) and ops[j][0] in ('lut','wta'): j += 1
+                if j == i + 1 and op[0] == 'lut':
+                    image = image.point(op[1]*len(image.getbands()))
+                else:
+                    image = LazyImager.run_pixel_ops(image,ops[i:j])
+                i = j
+                continue
+            i += 1
+        return image
+
+    @staticmethod
+    def run_pixel_ops(image,ops):
+        p = np.asarray(image)
+        for op in ops:
+            if op[0] == 'lut':
+                p = np.asarray(op[1],dtype=np.uint8)[p]
+            else:
+                if p.ndim == 2: p = np.asarray(Image.fromarray(p,'L').convert('RGB'))
+                p = p.astype(np.int64)
+                s = p.sum(axis=2); w = p.max(axis=2)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    winner = (s > 0) & (w/s >= op[1])
+                p = np.where(winner[..., None] & (p == w[..., None]), p, 0).astype(np.uint8)
+        return Image.fromarray(p,'RGB' if p.ndim == 3 else 'L')
+
+    def lazy(self,image): return not image and self.mode in LazyImager._lazy_modes_
+
+    def resize(self,new_width,new_height,image=False,resample=None):
+        if not self.lazy(image): return Imager.resize(self,new_width,new_height,image,resample)
+        return self.derive(('resize',new_width,new_height,resample),new_width,new_height)
+
+    def map_image(self,func,image=False):
+        if not self.lazy(image): return Imager.map_image(self,func,image)
+        return self.derive(('lut',LazyImager.lut(func)))
+
+    def map_color_wta(self,image=False,thresh=0.34):
+        if not self.lazy(image): return Imager.map_color_wta(self,image,thresh)
+        return self.derive(('wta',thresh),mode='RGB')
+
+    def scale_colors(self,image=False,degree=0.5):
+        if not self.lazy(image): return Imager.scale_colors(self,image,degree)
+        return self.derive(('color',degree))
+
+    # The methods that change the image in place must not change it for the imagers derived from this one
+    def unshare(self):
+        if self.shared: self._image = self._image.copy(); self.shared = False
+
+    def set_pixel(self,x,y,rgb):
+        self.image; self.unshare()
+        Imager.set_pixel(self,x,y,rgb)
+
+    def paste(self,im2,x0=0,y0=0):
+        self.image; self.unshare()
+        Imager.paste(self,im2,x0,y0)
+
+
 ### *********** TESTS ************************
 
 # Note: the default file paths for these examples are for unix!
@@ -192,8 +374,47 @@ def ptest3(fid1='images/kdfinger.jpeg', fid2="images/einstein.jpeg",newsize=250,
     return box
 
 def reformat(in_fid, out_ext='jpeg',scalex=1.0,scaley=1.0):
-    base, extension = in_fid.split('.')
+    base, extension = os.path.splitext(in_fid)
     im = Imager(in_fid)
     im = im.scale(scalex,scaley)
     im.dump_image(base,out_ext)
 
+# Reformats many files on a pool of processes (one per core by default), e.g. after a tourist run:
+# reformat_batch('vacation_pic*.jpeg','gif',0.5,0.5).  in_pattern is a directory (all its files) or a glob pattern.
+# The workers read and write the files themselves, and take one file at a time, so only one image per process is
+# in memory however many files there are.  Output goes next to the input files, or into out_dir.
+# A file that cannot be reformatted does not stop the batch: its error is reported with the others at the end.
+# Returns (in_fid, out_fid, seconds, error) for every file, in the order they finished.  error is None for the files
+# that were reformatted, otherwise out_fid is None and error is the message of the exception.
+
+def reformat_batch(in_pattern, out_ext='jpeg',scalex=1.0,scaley=1.0,out_dir=None,processes=None,verbose=True):
+    if os.path.isdir(in_pattern): in_pattern = os.path.join(in_pattern,'*')
+    jobs = ((fid,out_ext,scalex,scaley,out_dir) for fid in sorted(glob.glob(in_pattern)) if os.path.isfile(fid))
+    timings = []
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        for timing in pool.imap_unordered(reformat_timed,jobs):
+            timings.append(timing)
+            if verbose and not timing[3]: print('{:.3f} s  {} -> {}'.format(timing[2],timing[0],timing[1]))
+    failures = [timing for timing in timings if timing[3]]
+    if verbose and timings:
+        print('{} files in {:.2f} s, {:.3f} s per file of work'.format(
+            len(timings),time.perf_counter() - start,sum(timing[2] for timing in timings)/len(timings)))
+    if verbose and failures:
+        print('{} files failed:'.format(len(failures)))
+        for timing in failures: print('  {}: {}'.format(timing[0],timing[3]))
+    return timings
+
+# The work of one file for reformat_batch: decode, scale/convert, encode.  Errors are returned instead of raised,
+# so one bad file does not end the whole pool.  The message is returned, as not every exception can be pickled.
+def reformat_timed(job):
+    in_fid, out_ext, scalex, scaley, out_dir = job
+    start = time.perf_counter()
+    base = os.path.splitext(in_fid)[0]
+    if out_dir: base = os.path.join(out_dir,os.path.basename(base))
+    try:
+        Imager(in_fid).scale(scalex,scaley).dump_image(base,out_ext)
+    except Exception as error:
+        return in_fid, None, time.perf_counter() - start, '{}: {}'.format(type(error).__name__,error)
+    return in_fid, base+'.'+out_ext, time.perf_counter() - start, None
+
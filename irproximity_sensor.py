@@ -1,4 +1,4 @@
-import RPi.GPIO as GPIO
+from backend import GPIO
 
 
 class IRProximitySensor:
@@ -0,0 +1,51 @@
+"""Rolling latency statistics for the stages of the control loop"""
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatencyStats:
+    """Keeps the last `window` durations of every stage, and computes percentiles on request"""
+
+    def __init__(self, window=1000):
+        """window: number of samples kept per stage"""
+        self.window = window
+        self.samples = {}  # stage name -> deque of durations in seconds
+
+    def record(self, stage, duration):
+        """Adds a duration (in seconds) to a stage"""
+        if stage not in self.samples:
+            self.samples[stage] = deque(maxlen=self.window)
+        self.samples[stage].append(duration)
+
+    @contextmanager
+    def measure(self, stage):
+        """Context manager that records how long the body takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def get_percentiles(self, stage):
+        """Returns p50/p95/p99/max (in seconds) and the sample count of a stage"""
+        durations = sorted(self.samples[stage])
+        last = len(durations) - 1
+        return {'count': len(durations),
+                'p50': durations[round(0.50 * last)],
+                'p95': durations[round(0.95 * last)],
+                'p99': durations[round(0.99 * last)],
+                'max': durations[last]}
+
+    def get_stats(self):
+        """Returns the percentiles of every stage, in the order the stages were first seen"""
+        return {stage: self.get_percentiles(stage) for stage in self.samples}
+
+    def report(self):
+        """Returns the statistics as a readable table, in milliseconds"""
+        lines = ['{:<40}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('stage (ms)', 'count', 'p50', 'p95', 'p99', 'max')]
+        for stage, stats in self.get_stats().items():
+            lines.append('{:<40}{:>8}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}'.format(
+                stage, stats['count'], 1000 * stats['p50'], 1000 * stats['p95'],
+                1000 * stats['p99'], 1000 * stats['max']))
+        return '\n'.join(lines)
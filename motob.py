@@ -31,6 +31,8 @@ class Motob():
             self.motors.right(self.value[1], 1)
         elif self.value[0] == "S":
             self.motors.stop()
+        elif self.value[0] == "V":  # Wheel speeds [left, right] from a blending arbitrator
+            self.motors.set_value(self.value[1:3], 0.2)
 
 #motob = Motob()
 #ZumoButton().wait_for_press()
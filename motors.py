@@ -1,7 +1,6 @@
 #!/usr/bin/env python
-from time import sleep
-import RPi.GPIO as GPIO
-import wiringpi as wp
+from backend import sleep
+from backend import wiringpi as wp
 
 
 class Motors():
@@ -0,0 +1,112 @@
+"""Continuous ultrasonic ranging in the background. The sensor is pinged at its safe repetition rate, the timestamped
+distances are kept in a ring buffer, and reading the distance returns the latest filtered value at once instead of
+waiting for a ping (Ultrasonic.update takes at least 0.3 s). The filter drops lost echoes, takes the median of the
+recent pings, and leaves out the pings that are outliers around it before taking the median again.
+A RangingService has the interface of Ultrasonic (update, get_value, reset), so it can replace the sensor of a
+DistanceSensob (see DistanceSensob.use_ranging)"""
+import collections
+import statistics
+import threading
+import backend
+import ultrasonic
+
+PING_PERIOD = 0.06  # The HC-SR04 needs 60 ms from one trigger to the next, so echoes of the last ping have died out
+
+
+class RangingService:
+    """Pings an ultrasonic sensor every period seconds in the background.
+    size: pings kept in the ring buffer, window: latest pings the filtered distance is taken from,
+    outlier_factor: pings further from the median than this many median absolute deviations (and more than
+    min_spread cm) are outliers
+    max_age: seconds a ping is used for, None for one period more than the window spans. When the pings stop
+    (e.g. the sensor fails), the distance is given up instead of repeating the last one"""
+
+    def __init__(self, sensor=None, period=PING_PERIOD, size=32, window=5, outlier_factor=3.0, min_spread=2.0,
+                 max_age=None):
+        self.sensor = sensor if sensor is not None else ultrasonic.Ultrasonic(pulse_delay=0)
+        self.period = period
+        self.window = window
+        self.outlier_factor = outlier_factor
+        self.min_spread = min_spread
+        self.max_age = max_age if max_age is not None else (window + 1) * period
+        self.errors = 0  # Pings that failed with an exception
+        self.last_error = None
+        self.samples = collections.deque(maxlen=size)  # (backend.monotonic(), distance in cm) of the latest pings
+        self.lock = threading.Lock()
+        self.pinger = None
+        self.value = None
+        self.time = None  # Median time of the pings in the value, None if there were none
+
+    def start(self):
+        """Starts pinging"""
+        if self.pinger is None:
+            self.pinger = backend.start_periodic(self.period, self.ping)
+
+    def stop(self):
+        """Stops pinging. The samples are kept"""
+        if self.pinger is not None:
+            self.pinger.stop()
+            self.pinger = None
+
+    def ping(self):
+        """Measures one distance and adds it to the ring buffer. Runs in the background, so a failed ping is
+        counted in errors instead of ending the pinging"""
+        try:
+            distance = self.sensor.sensor_get_value()
+        except Exception as error:
+            self.errors += 1
+            self.last_error = error
+            return
+        with self.lock:
+            self.samples.append((backend.monotonic(), distance))
+
+    def get_samples(self):
+        """Returns the (time, distance) of the pings in the ring buffer, oldest first"""
+        with self.lock:
+            return list(self.samples)
+
+    def keep(self, samples):
+        """Returns the (time, distance) pings that are neither lost echoes nor outliers"""
+        samples = [sample for sample in samples if sample[1] > 0]  # 0 is a lost echo
+        if not samples:
+            return []
+        median = statistics.median(distance for _, distance in samples)
+        spread = max(self.outlier_factor * statistics.median(abs(distance - median) for _, distance in samples),
+                     self.min_spread)
+        return [sample for sample in samples if abs(sample[1] - median) <= spread]
+
+    def filter(self, distances):
+        """Returns the filtered distance of some pings, None if all echoes were lost"""
+        kept = self.keep([(None, distance) for distance in distances])
+        return statistics.median(distance for _, distance in kept) if kept else None
+
+    def get_distance(self):
+        """Returns (time, filtered distance) of the latest window pings, None if no ping younger than max_age has
+        had an echo. The time is the median time of the pings kept, so a distance that changes steadily is stamped
+        with the time it was the distance at, not with the time of the latest ping"""
+        now = backend.monotonic()
+        kept = self.keep([sample for sample in self.get_samples()[-self.window:] if now - sample[0] <= self.max_age])
+        if not kept:
+            return None
+        return statistics.median(time for time, _ in kept), statistics.median(distance for _, distance in kept)
+
+    def update(self):
+        """Returns the latest filtered distance. Only waits (at most 0.5 s) when there is no recent ping with an
+        echo, and returns 0 if there still is none"""
+        if self.pinger is None:
+            self.start()
+        latest = self.get_distance()
+        deadline = backend.monotonic() + 0.5
+        while latest is None and backend.monotonic() < deadline:
+            backend.sleep(self.period / 4)
+            latest = self.get_distance()
+        self.value = latest[1] if latest else 0
+        self.time = latest[0] if latest else None
+        return self.value
+
+    def get_value(self):
+        return self.value
+
+    def reset(self):
+        """Forgets the value read, the ring buffer is kept"""
+        self.value = None
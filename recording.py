@@ -0,0 +1,88 @@
+"""Recording of the raw values returned by the sensors, so a session can be replayed later (see replay.py).
+The log is a gzip-compressed stream of pickled entries"""
+import gzip
+import pickle
+from PIL import Image
+import backend
+
+
+def encode_value(value):
+    """Turns a sensor value into something that can be pickled compactly. Images are stored as raw bytes"""
+    if isinstance(value, Image.Image):
+        return ('image', value.mode, value.size, value.tobytes())
+    return value
+
+
+def decode_value(value):
+    """Inverse of encode_value"""
+    if isinstance(value, tuple) and value and value[0] == 'image':
+        return Image.frombytes(value[1], value[2], value[3])
+    return value
+
+
+class SensorLog:
+    """Writes entries to a recording file. An entry is (kind, sensor name, tick, timestamp, value), where kind
+    is 'reset_value' for the value a sensor has after reset() and 'sample' for a value returned by update()"""
+
+    def __init__(self, path):
+        self.file = gzip.open(path, 'wb')
+
+    def write(self, kind, name, tick, timestamp, value):
+        """Appends one entry to the log"""
+        pickle.dump((kind, name, tick, timestamp, encode_value(value)), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        """Closes the log file"""
+        self.file.close()
+
+
+def read_log(path):
+    """Generator over the entries of a recording file"""
+    with gzip.open(path, 'rb') as file:
+        while True:
+            try:
+                kind, name, tick, timestamp, value = pickle.load(file)
+            except EOFError:
+                break
+            yield kind, name, tick, timestamp, decode_value(value)
+
+
+class RecordingSensor:
+    """Wraps a sensor (Ultrasonic, ReflectanceSensors, Camera) and logs every value its update() returns"""
+
+    def __init__(self, sensor, name, recorder):
+        self.sensor = sensor
+        self.name = name
+        self.recorder = recorder
+
+    def get_value(self):
+        return self.sensor.get_value()
+
+    def update(self):
+        value = self.sensor.update()
+        self.recorder.log.write('sample', self.name, self.recorder.bbcon.tick, backend.monotonic(), value)
+        return value
+
+    def reset(self):
+        self.sensor.reset()
+
+
+class Recorder:
+    """Records the sensor values of every sensob of a controller, tagged with the timestep they were read in.
+    Install it before the first timestep"""
+
+    def __init__(self, bbcon, path):
+        self.bbcon = bbcon
+        self.log = SensorLog(path)
+        bbcon.prefetch = False  # Samples taken in the background belong to no timestep
+        for this_sensob in bbcon.sensobs:
+            name = type(this_sensob).__name__
+            self.log.write('reset_value', name, bbcon.tick, backend.monotonic(), this_sensob.sensors.get_value())
+            this_sensob.sensors = RecordingSensor(this_sensob.sensors, name, self)
+
+    def close(self):
+        """Puts the original sensors back and closes the log"""
+        for this_sensob in self.bbcon.sensobs:
+            if isinstance(this_sensob.sensors, RecordingSensor):
+                this_sensob.sensors = this_sensob.sensors.sensor
+        self.log.close()
@@ -1,14 +1,25 @@
 #!/usr/bin/env python
-from time import sleep
-import datetime
-import RPi.GPIO as GPIO
+from backend import GPIO
+from backend import sleep
+import backend
+import edge_timer
 
 
 class ReflectanceSensors():
     # The constructor allows students to decide if they want to auto_calibrate
     # the robot, or if they want to hard code the min and max readings of the
-    # reflectance sensors
-    def __init__(self, auto_calibrate=False, min_reading=100, max_reading=1000):
+    # reflectance sensors.
+    # With parallel, all six capacitors discharge at the same time and are timed in one polling loop,
+    # so a reading takes as long as the slowest discharge instead of the sum of all six.
+    # No discharge is timed longer than timeout seconds, the sensors that have not discharged by then
+    # get the timeout as their reading.
+    # With edge_events, the falling edges are timed with GPIO edge callbacks instead of a polling loop
+    def __init__(self, auto_calibrate=False, min_reading=100, max_reading=1000, parallel=True, timeout=0.003,
+                 edge_events=False):
+        self.parallel = parallel
+        self.timeout_ns = round(timeout * 1e9)
+        self.edge_events = edge_events
+        self.discharge_timer = None  # EdgeTimer on the sensor pins, made at the first reading with edge_events
         self.setup()
         if (auto_calibrate):
             # Calibration loop should last ~5 seconds
@@ -47,44 +58,87 @@ class ReflectanceSensors():
 
     def calibrate(self):
         print("calibrating...")
-        self.recharge_capacitors()
+        times = self.get_sensor_readings()
 
-        # GPIO.setup(sensor_inputs, GPIO.IN)
         for pin in self.sensor_inputs:
-            time = self.get_sensor_reading(pin)
+            microseconds = times[pin]
 
             # Get the index from the map
             index = self.sensor_indices[pin]
 
             # This is the first iteration
             if (self.max_val[index] == -1):
-                self.max_val[index] = time.microseconds
-                self.min_val[index] = time.microseconds
+                self.max_val[index] = microseconds
+                self.min_val[index] = microseconds
             else:
                 # Store the min and max values seen during calibration
-                if (time.microseconds > self.max_val[index]):
-                    self.max_val[index] = time.microseconds
-                elif (time.microseconds < self.min_val[index]):
-                    self.min_val[index] = time.microseconds
+                if (microseconds > self.max_val[index]):
+                    self.max_val[index] = microseconds
+                elif (microseconds < self.min_val[index]):
+                    self.min_val[index] = microseconds
 
             # Print the calculated time in microseconds
             print("Pin: " + str(pin))
-            print(time.microseconds)
+            print(microseconds)
+
+    # Recharges the capacitors and returns a dictionary mapping each channel to its discharge time in microseconds
+    def get_sensor_readings(self):
+        self.recharge_capacitors()
+        if self.edge_events:
+            return self.get_edge_readings()
+        if self.parallel:
+            return self.get_parallel_readings()
+        return {pin: self.get_sensor_reading(pin) for pin in self.sensor_inputs}
 
+    # Discharge time of one sensor in microseconds
     def get_sensor_reading(self, pin):
         GPIO.setup(pin, GPIO.IN)
         # Measure the time
-        start_time = datetime.datetime.now()
+        start_time = backend.monotonic_ns()
+        end_time = start_time
 
-        while GPIO.input(pin):
-            pass
+        while GPIO.input(pin) and end_time - start_time < self.timeout_ns:
+            end_time = backend.monotonic_ns()
 
         # Measure time again
-        end_time = datetime.datetime.now()
-        # Calculate the time passed
-        time = end_time - start_time
-        return time
-
+        end_time = backend.monotonic_ns()
+        return min(end_time - start_time, self.timeout_ns) // 1000
+
+    # Discharge times of all sensors in microseconds, from one discharge: all pins are switched to input
+    # together and polled in turn, and each pin gets the time of the first round it was seen low in
+    def get_parallel_readings(self):
+        GPIO.setup(self.sensor_inputs, GPIO.IN)
+        start_time = backend.monotonic_ns()
+        times = {}
+        pending = list(self.sensor_inputs)
+        while pending:
+            levels = [GPIO.input(pin) for pin in pending]
+            elapsed = backend.monotonic_ns() - start_time
+            if elapsed >= self.timeout_ns:
+                for pin in pending:
+                    times[pin] = self.timeout_ns // 1000
+                break
+            for pin, level in zip(pending, levels):
+                if not level:
+                    times[pin] = elapsed // 1000
+            pending = [pin for pin in pending if pin not in times]
+        return times
+
+
+    # Discharge times of all sensors in microseconds, from one discharge timed by falling-edge callbacks
+    def get_edge_readings(self):
+        if self.discharge_timer is None:
+            self.discharge_timer = edge_timer.EdgeTimer(self.sensor_inputs, GPIO.FALLING)
+        GPIO.setup(self.sensor_inputs, GPIO.IN)
+        start_time = backend.monotonic_ns()
+        self.discharge_timer.arm()
+        try:
+            self.discharge_timer.record_missed(0)
+            edges = self.discharge_timer.wait(1, self.timeout_ns / 1e9)
+        finally:
+            self.discharge_timer.disarm()
+        return {pin: min(edges[pin][0] - start_time, self.timeout_ns) // 1000 if edges[pin] else self.timeout_ns // 1000
+                for pin in self.sensor_inputs}
 
     def recharge_capacitors(self):
         # Make all sensors an output, and set all to HIGH
@@ -113,12 +167,10 @@ class ReflectanceSensors():
 
 
     def compute_value(self):
-        self.recharge_capacitors()
+        times = self.get_sensor_readings()
         for pin in self.sensor_inputs:
-            time = self.get_sensor_reading(pin)
-
             index = self.sensor_indices[pin]
-            self.value[index] = 1 - self.normalize(index, time.microseconds)
+            self.value[index] = 1 - self.normalize(index, times[pin])
 
 
     # Uses the calibrated min and maxs for each sensor to return a normalized
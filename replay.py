@@ -0,0 +1,78 @@
+"""Replay of a recorded session (see recording.py) without the sensors and motors, as fast as the CPU allows.
+The sensobs are updated in the same timesteps as in the recording, so the behaviors see the same values.
+Importing this module selects no backend; main selects the simulator before the controller (replay_bbcon.py) is
+imported"""
+import sys
+from collections import deque
+import backend
+
+
+class ReplaySensor:
+    """Stands in for a sensor, and returns the recorded values in order"""
+
+    def __init__(self, reset_value):
+        self.reset_value = reset_value
+        self.value = reset_value
+        self.samples = deque()  # (tick, timestamp, value) in recording order
+
+    def get_value(self):
+        return self.value
+
+    def update(self):
+        self.value = self.samples.popleft()[2]
+        return self.value
+
+    def reset(self):
+        self.value = self.reset_value
+
+    def has_sample(self, tick):
+        """Returns True if the sensor was updated in the given timestep of the recording"""
+        return bool(self.samples) and self.samples[0][0] == tick
+
+    def next_timestamp(self):
+        """Returns the backend.monotonic() the next sample was recorded at"""
+        return self.samples[0][1]
+
+
+class NullMotors:
+    """Stands in for Motors. Remembers the last command instead of driving, and never sleeps"""
+
+    def __init__(self):
+        self.command = None
+
+    def forward(self, speed=0.25, dur=None):
+        self.command = ('forward', speed, dur)
+
+    def backward(self, speed=0.25, dur=None):
+        self.command = ('backward', speed, dur)
+
+    def left(self, speed=0.25, dur=None):
+        self.command = ('left', speed, dur)
+
+    def right(self, speed=0.25, dur=None):
+        self.command = ('right', speed, dur)
+
+    def stop(self):
+        self.command = ('stop',)
+
+    def set_value(self, val, dur=None):
+        self.command = ('set_value', val, dur)
+
+
+def main(path, telemetry_path=None):
+    """Replays a recording until it runs out or a behavior requests a halt. Returns the controller"""
+    backend.use('sim')  # Importing bbcon builds the sensobs of behavior.py, which must not look for the robot
+    import replay_bbcon
+    controller = replay_bbcon.ReplayBbcon(path, telemetry_path)
+    while not controller.is_finished():
+        controller.run_one_timestep()
+        if controller.halt_request:
+            break
+    print('Replayed', controller.tick, 'timesteps')
+    print(controller.latency.report())
+    controller.telemetry.close()
+    return controller
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
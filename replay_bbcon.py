@@ -0,0 +1,42 @@
+"""The controller of a replay (see replay.py). Importing this module imports bbcon, which builds the sensobs of
+behavior.py on the current backend, so the simulator must be selected first"""
+import backend
+import bbcon
+import recording
+from replay import ReplaySensor, NullMotors
+
+
+class ReplayBbcon(bbcon.Bbcon):
+    """Behavior-Based Controller fed by a recording instead of the sensors"""
+
+    def __init__(self, path, telemetry_path=None):
+        super(ReplayBbcon, self).__init__(None, telemetry_path)
+        sensors = {}
+        for kind, name, tick, timestamp, value in recording.read_log(path):
+            if kind == 'reset_value':
+                sensors[name] = ReplaySensor(value)
+            else:
+                sensors[name].samples.append((tick, timestamp, value))
+        for this_sensob in self.sensobs:
+            this_sensob.sensors = sensors[type(this_sensob).__name__]
+            this_sensob.set_value(this_sensob.sensors.get_value())
+        self.motobs.motors = NullMotors()
+        self.prefetch = False  # The samples come from the recording
+
+    def sensobs_to_update(self):
+        """Returns the sensobs that were updated in this timestep of the recording"""
+        return [this_sensob for this_sensob in self.sensobs if this_sensob.sensors.has_sample(self.tick)]
+
+    def update_sensob(self, this_sensob):
+        """Sets the simulated clock to the time the sample was recorded at before replaying it, so the sensob
+        gets the recorded timestamp and the distance tracker the recorded intervals"""
+        world = backend.get().world
+        world.time = max(world.time, this_sensob.sensors.next_timestamp())
+        super(ReplayBbcon, self).update_sensob(this_sensob)
+
+    def wait(self):
+        """No waiting in a replay"""
+
+    def is_finished(self):
+        """Returns True when all recorded samples have been used"""
+        return not any(this_sensob.sensors.samples for this_sensob in self.sensobs)
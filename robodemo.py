@@ -65,11 +65,12 @@ def tourist(steps=25,shots=5,speed=.25):
 
 def shoot_panorama(camera,motors,shots=5):
     s = 1
-    im = IMR.Imager(image=camera.update()).scale(s,s)
+    pano = IMR.PanoramaBuilder(frames=shots)
+    pano.add(IMR.Imager(image=camera.update()).scale(s,s))
     rotation_time = 3/shots # At a speed of 0.5(of max), it takes about 3 seconds to rotate 360 degrees
     for i in range(shots-1):
         motors.right(0.5,rotation_time)
-        im = im.concat_horiz(IMR.Imager(image=camera.update()))
-    return im
+        pano.add(IMR.Imager(image=camera.update()))
+    return pano.get_imager()
 
 dancer()
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""Fixed-rate scheduler for the control loop. Sleeps only for the time left until the next tick deadline"""
+import backend
+
+
+class Scheduler:
+    """Keeps the control loop at a target tick rate, and keeps track of overruns and skipped ticks"""
+
+    def __init__(self, tick_rate):
+        """tick_rate: the wanted number of timesteps per second"""
+        self.period = 1.0 / tick_rate
+        self.start_time = None
+        self.deadline = None
+        self.ticks = 0  # Number of completed ticks
+        self.overruns = 0  # Number of ticks that took longer than one period
+        self.skipped_ticks = 0  # Number of ticks left out because of overruns. An overrun always leaves out at least
+        # one: the loop waits for the first deadline ahead instead of starting the next tick late
+
+    def start(self):
+        """Starts the clock. The first deadline is one period from now"""
+        self.start_time = backend.monotonic()
+        self.deadline = self.start_time + self.period
+
+    def delay(self):
+        """Called at the end of a tick. Returns how long to sleep until the next deadline,
+        and moves the deadline one period ahead. If the tick overran, the missed deadlines are skipped
+        so the loop gets back in phase instead of trying to catch up"""
+        if self.deadline is None:
+            self.start()
+        now = backend.monotonic()
+        self.ticks += 1
+        remaining = self.deadline - now
+        if remaining < 0:
+            self.overruns += 1
+            skipped = int(-remaining // self.period) + 1
+            self.skipped_ticks += skipped
+            self.deadline += skipped * self.period
+            remaining = self.deadline - now
+        self.deadline += self.period
+        return remaining
+
+    def wait(self):
+        """Sleeps until the next deadline"""
+        backend.sleep(self.delay())
+
+    def get_rate(self):
+        """Returns the achieved tick rate (ticks per second) since the scheduler was started"""
+        if self.start_time is None or self.ticks == 0:
+            return 0.0
+        return self.ticks / (backend.monotonic() - self.start_time)
+
+    def get_stats(self):
+        """Returns a dictionary with the scheduler statistics"""
+        return {'target_rate': 1.0 / self.period, 'achieved_rate': self.get_rate(), 'ticks': self.ticks,
+                'overruns': self.overruns, 'skipped_ticks': self.skipped_ticks}
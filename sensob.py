@@ -1,33 +1,98 @@
+import functools
+import threading
 from PIL import Image
+import backend
 import ultrasonic
 import reflectance_sensors
 import camera
+import color_classifier
+import tracking
+
+
+def feature(method):
+    """Decorator for values derived from the current sample of a sensob. The method runs at most once per
+    sample: the result is cached until the next update(), reset() or set_value()"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached(self):
+        if name not in self.features:
+            self.features[name] = method(self)
+        return self.features[name]
+    return cached
 
 
 class Sensob:
-    """Superclass for the Sensob classes"""
+    """Superclass for the Sensob classes.
+    sample_period: seconds between two samples, 0 means a new sample every timestep
+    max_age: seconds a sample may be kept before it is reset, 0 means it is reset every timestep"""
+    sample_period = 0
+    max_age = 0
 
     def __init__(self):
         """Initializes the sensob objects with sensors and value"""
         self.sensors = None
         self.value = None
+        self.timestamp = None  # backend.monotonic() of the current sample, None if there is no sample
+        self.features = {}  # Cached results of the feature methods for the current sample
 
     def update(self):
-        """Updates all the sensors in the sensob with the update function to the sensor"""
-        self.sensors.update()
+        """Updates the sensors, and stores the new value and the time it was sampled"""
+        self.value = self.sensors.update()
+        self.timestamp = backend.monotonic()
+        self.features.clear()
+
+    def set_value(self, value):
+        """Replaces the current value, without touching the sensors"""
+        self.value = value
+        self.features.clear()
 
     def get_value(self):
         """returns the value"""
         return self.value
 
     def reset(self):
-        """resets the sensors with their reset function"""
+        """resets the sensors with their reset function, and also resets the value"""
         self.sensors.reset()
+        self.value = self.sensors.get_value()
+        self.timestamp = None
+        self.features.clear()
+
+    def restart(self):
+        """Forgets the current sample and whatever was kept from earlier ones, for a new controller"""
+        self.reset()
+
+    def prefetch(self):
+        """Called when a behavior will need this sensob soon. Sensobs that can sample in the background start
+        doing so, the others ignore it"""
+
+    def get_telemetry_value(self):
+        """Returns the value stored in the telemetry as a float, nan if there is no sample"""
+        if self.value is None:
+            return float('nan')
+        return self.get_value()
+
+    def get_age(self, now=None):
+        """Returns the age of the current sample in seconds, None if there is no sample"""
+        if self.timestamp is None:
+            return None
+        return (now if now is not None else backend.monotonic()) - self.timestamp
+
+    def is_due(self, now):
+        """Returns True if the sample is older than sample_period and should be updated"""
+        return self.timestamp is None or now - self.timestamp >= self.sample_period
+
+    def is_expired(self, now):
+        """Returns True if the sample is older than max_age and should be reset"""
+        return self.timestamp is None or now - self.timestamp >= self.max_age
 
 
 class DistanceSensob(Sensob):
     """Distance Sensob class, used for calculating distances
-    value: distance in cm"""
+    value: distance in cm. Every sample also goes into an AlphaBetaTracker, which estimates the closing speed,
+    so behaviors can stop on the distance predicted for the next sample instead of the last one"""
+    sample_period = 0.3  # The ultrasonic sensor needs 0.3 s between pulses anyway
+    max_age = 1.0
 
     def __init__(self):
         """Initializes the object with an Ultrasonic sensor and sets the value to the default
@@ -35,15 +100,56 @@ class DistanceSensob(Sensob):
         super(DistanceSensob, self).__init__()
         self.sensors = ultrasonic.Ultrasonic()
         self.value = self.sensors.get_value()
+        self.tracker = tracking.AlphaBetaTracker()
+        self.ranging = None  # The ranging.RangingService the distances come from, see use_ranging
 
     def update(self):
-        """updates the sensor and updates the value"""
-        self.value = self.sensors.update()
+        """Updates the sensors, and feeds the new sample to the tracker. A distance from a ranging service is fed
+        at the median time of the pings it is the median of, and only if that is later than the last one fed"""
+        super(DistanceSensob, self).update()
+        if not self.ranging:
+            self.tracker.add(self.timestamp, self.value)
+        elif self.ranging.time is not None and (self.tracker.time is None or self.ranging.time > self.tracker.time):
+            self.tracker.add(self.ranging.time, self.value)
 
-    def reset(self):
-        """resets the sensor, and also resets the value"""
-        self.sensors.reset()
-        self.value = self.sensors.get_value()
+    def restart(self):
+        """Also forgets the track"""
+        super(DistanceSensob, self).restart()
+        self.tracker.reset()
+
+    @feature
+    def tracked_distance(self):
+        """Distance estimated by the tracker at the time of the sample, None before the first echo"""
+        return self.tracker.predict(self.timestamp) if self.timestamp is not None else None
+
+    @feature
+    def closing_speed(self):
+        """Speed in cm/s the robot closes in on the obstacle at, negative when it moves away"""
+        return self.tracker.closing_speed()
+
+    def time_to_collision(self, distance=0.0):
+        """Seconds from now until the distance is predicted to be down to distance, math.inf when not closing in"""
+        return self.tracker.time_to_collision(backend.monotonic(), distance)
+
+    def sample_interval(self):
+        """Seconds between the last two tracked samples, sample_period before there are two"""
+        return self.tracker.interval if self.tracker.interval is not None else self.sample_period
+
+    def contact_within(self, distance, seconds=None):
+        """Returns True if the distance is predicted to be at or below distance within seconds from now.
+        seconds None: by the time the next sample is expected"""
+        seconds = seconds if seconds is not None else self.sample_interval()
+        predicted = self.tracker.predict(backend.monotonic() + seconds)
+        return predicted is not None and predicted <= distance
+
+    def use_ranging(self, service):
+        """Reads the distance from a ranging.RangingService instead of pinging on every update. The service pings
+        in the background, so an update returns at once and can happen every timestep"""
+        self.sensors = service
+        self.ranging = service
+        self.sample_period = 0
+        self.max_age = 3 * service.period
+        service.start()
 
 
 class IRSensob(Sensob):
@@ -55,45 +161,124 @@ class IRSensob(Sensob):
         self.sensors = reflectance_sensors.ReflectanceSensors()
         self.value = self.sensors.get_value()
 
-    def update(self):
-        """Updates the sensor and sets the value to an 6 index array"""
-        self.value = self.sensors.update()
-
-    def reset(self):
-        """Resets the sensors and value"""
-        self.sensors.reset()
-        self.value = self.sensors.get_value()
-
     def get_value(self):
-        """Returns true if one of the array value is dark, else returns false"""
+        """Returns the reflectance of the darkest sensor, low values are dark"""
+        return self.darkest()
+
+    @feature
+    def darkest(self):
+        """Reflectance of the darkest sensor"""
         return min(self.value)
 
+    @feature
+    def darkest_index(self):
+        """Index of the darkest sensor, 0 is leftmost"""
+        return self.value.index(self.darkest())
+
+    @feature
+    def line_position(self):
+        """Position of the line under the robot from -1 (leftmost sensor) to 1 (rightmost sensor), as the
+        darkness-weighted mean of the sensor positions. None if no sensor sees anything dark"""
+        darkness = [max(0.0, 1 - value) for value in self.value]
+        total = sum(darkness)
+        if total == 0:
+            return None
+        middle = (len(darkness) - 1) / 2
+        return sum(i * dark for i, dark in enumerate(darkness)) / total / middle - 1
+
 
 class CameraSensob(Sensob):
-    """Camera Sensob class, used for checking amount of green in a picture"""
+    """Camera Sensob class, used for checking amount of green in a picture.
+    classifier: the colors counted in the picture, one of them named 'green'. Replace it to count more colors, or
+    to only look at a region of interest"""
+    sample_period = 0.5  # A raspistill capture takes about this long
+    max_age = 1.0
+    classifier = color_classifier.ColorClassifier([color_classifier.GREEN])
+    prefetch_time = 2.0  # Seconds the background worker keeps taking pictures after the last prefetch()
+    prefetch_period = 0.05  # Seconds the background worker rests between two pictures
+    estimate = False  # Decide green_at_least from a random sample of the pixels (see ColorClassifier.estimate)
 
     def __init__(self):
         """Initializes the class with the sensor and value"""
         super(CameraSensob, self).__init__()
         self.sensors = camera.Camera()
         self.value = self.sensors.get_value()
+        self.capture_lock = threading.Lock()  # One picture at a time
+        self.prefetch_lock = threading.Lock()
+        self.prefetched = None  # (picture, timestamp, color fractions) of the latest frame of the worker
+        self.prefetch_until = 0.0
+        self.worker = None
+        self.worker_wakeup = threading.Event()  # Never set, the worker rests on it
 
     def update(self):
-        """Updates the sensor and sets the value"""
-        self.value = self.sensors.update()
-        print("******* Smile ^^")
+        """Takes the freshest frame of the background worker if it has one that is recent enough, with the
+        colors already counted. Otherwise takes a picture and waits for it"""
+        with self.prefetch_lock:
+            prefetched, self.prefetched = self.prefetched, None
+        if prefetched and backend.monotonic() - prefetched[1] < self.max_age:
+            self.value, self.timestamp = prefetched[0], prefetched[1]
+            self.features = {'color_fractions': prefetched[2]}
+            return
+        with self.capture_lock:
+            super(CameraSensob, self).update()
 
     def reset(self):
-        """Resets the sensor and the value"""
-        self.sensors.reset()
-        self.value = self.sensors.get_value()
+        """Forgets the sample. The camera is left alone, so this never waits for a picture the background worker is
+        taking: the camera's value is replaced by the next picture anyway"""
+        self.value = None
+        self.timestamp = None
+        self.features.clear()
+
+    def prefetch(self):
+        """Starts (or keeps running) the background worker that takes and analyzes pictures, so the next update
+        does not have to wait for the camera"""
+        with self.prefetch_lock:
+            self.prefetch_until = backend.monotonic() + self.prefetch_time
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.prefetch_frames, daemon=True)
+                self.worker.start()
+
+    def prefetch_frames(self):
+        """Background worker: takes pictures and counts their colors until prefetch_time after the last prefetch()"""
+        while backend.monotonic() < self.prefetch_until:
+            with self.capture_lock:
+                value = self.sensors.update()
+                timestamp = backend.monotonic()
+            fractions = self.classifier.fractions(value)
+            with self.prefetch_lock:
+                self.prefetched = (value, timestamp, fractions)
+            self.worker_wakeup.wait(self.prefetch_period)
 
     def get_value(self):
-        pict = self.value
-        img = list(pict.getdata())
-        counter = 0
-        for i in img:
-            if (i[0] <= 150) and (i[1] >= 150) and (i[2] <= 150):
-                counter += 1
-        return counter/len(img)
+        """Returns the fraction of green pixels in the picture"""
+        return self.green_fraction()
+
+    @feature
+    def color_fractions(self):
+        """Fraction of the pixels of every color of the classifier, as {color name: fraction}"""
+        return self.classifier.fractions(self.value)
+
+    @feature
+    def green_fraction(self):
+        """Fraction of the pixels that are green"""
+        return self.color_fractions()['green']
+
+    def green_at_least(self, threshold):
+        """Returns True if at least threshold of the pixels are green. With estimate set, and the colors not
+        counted yet, this is decided from a sample of the pixels. Cached per threshold like a feature"""
+        if not self.estimate or 'color_fractions' in self.features:
+            return self.green_fraction() >= threshold
+        key = 'green_at_least ' + str(threshold)
+        if key not in self.features:
+            self.features[key] = self.classifier.estimate(self.value, 'green', threshold)
+        return self.features[key].exceeds
 
+    def get_telemetry_value(self):
+        """Returns the green fraction already worked out for the sample, counted or estimated, without counting
+        the pixels for the telemetry alone. nan if there is no sample or nothing has looked at it"""
+        if self.value is None:
+            return float('nan')
+        if 'color_fractions' in self.features:
+            return self.features['color_fractions']['green']
+        estimates = [value for key, value in self.features.items() if key.startswith('green_at_least ')]
+        return estimates[0].fraction if estimates else float('nan')
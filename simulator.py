@@ -0,0 +1,431 @@
+"""Simulated Zumo robot in a 2D arena, used as the 'sim' backend (see backend.py).
+The arena is a rectangle surrounded by a dark border line, with round obstacles and colored targets.
+The simulated GPIO and wiringpi produce ultrasonic echo timings, reflectance discharge times and camera frames
+from the robot pose, and the pose is driven by the motor pins. Time is virtual: sleeping and polling pins only
+advance the simulation clock, so the controller runs faster than realtime"""
+import math
+import threading
+from PIL import Image, ImageDraw
+
+SPEED_OF_SOUND = 34400  # cm/s
+MAX_RANGE = 400  # cm, the ultrasonic sensor reports this when there is no echo
+POLL_TIME = 0.000005  # Virtual time one GPIO.input call takes
+STEP = 0.01  # Longest integration step in seconds
+
+# Pins, as used by the driver modules
+TRIG_PIN = 26
+ECHO_PIN = 11
+REFLECTANCE_PINS = [33, 32, 31, 37, 36, 29]  # Sensors from left to right
+IR_PROXIMITY_PINS = [8, 10]
+LEFT_PWM, RIGHT_PWM, LEFT_DIR, RIGHT_DIR = 18, 19, 23, 24
+BUTTON_PIN = 22
+
+
+class Obstacle:
+    """Round obstacle. Targets are the obstacles the robot should attack"""
+
+    def __init__(self, x, y, radius=6.0, color=(120, 120, 120), target=False):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.color = color
+        self.target = target
+
+
+class Arena:
+    """Rectangular arena in cm, with a dark border line of width line_width just inside the edge"""
+
+    def __init__(self, width=150.0, height=150.0, line_width=5.0, obstacles=None):
+        self.width = width
+        self.height = height
+        self.line_width = line_width
+        if obstacles is None:
+            obstacles = [Obstacle(75, 110), Obstacle(110, 40, color=(30, 180, 40), target=True)]
+        self.obstacles = obstacles
+
+    def inside(self, x, y):
+        """Returns True if (x, y) is inside the outer edge of the arena"""
+        return 0 <= x <= self.width and 0 <= y <= self.height
+
+    def floor_darkness(self, x, y):
+        """Returns 1.0 on the border line and 0.0 elsewhere"""
+        if not self.inside(x, y):
+            return 0.0
+        edge = min(x, y, self.width - x, self.height - y)
+        return 1.0 if edge <= self.line_width else 0.0
+
+    def cast_ray(self, x, y, angle, max_range=MAX_RANGE):
+        """Returns (distance, obstacle) of the first obstacle hit by a ray, (max_range, None) if nothing is hit"""
+        dx, dy = math.cos(angle), math.sin(angle)
+        nearest, hit = max_range, None
+        for obstacle in self.obstacles:
+            ox, oy = obstacle.x - x, obstacle.y - y
+            along = ox * dx + oy * dy
+            if along <= 0:
+                continue
+            across2 = ox * ox + oy * oy - along * along
+            if across2 > obstacle.radius ** 2:
+                continue
+            distance = along - math.sqrt(obstacle.radius ** 2 - across2)
+            if 0 <= distance < nearest:
+                nearest, hit = distance, obstacle
+        return nearest, hit
+
+
+class World:
+    """The arena, the robot pose and the virtual clock, plus the outcome counters used when tuning"""
+    radius = 5.0  # cm
+    wheel_base = 9.0  # cm
+    max_speed = 20.0  # cm/s at full duty cycle. A turn at half speed takes about 3 s, as in robodemo.py
+    max_duty = 1024
+    sensor_offset = 4.0  # cm from the center to the reflectance sensors
+    sensor_spread = 1.4  # cm between two reflectance sensors
+
+    def __init__(self, arena=None, x=40.0, y=40.0, heading=0.0):
+        self.arena = arena if arena else Arena()
+        self.x = x
+        self.y = y
+        self.heading = heading  # radians, counterclockwise from the x axis
+        self.time = 0.0
+        self.duty = {LEFT_PWM: 0, RIGHT_PWM: 0}
+        self.reverse = {LEFT_PWM: 0, RIGHT_PWM: 0}
+        self.lock = threading.RLock()
+        # Outcome counters
+        self.line_crossings = 0
+        self.collisions = 0  # Number of times the robot ran into an obstacle that is not a target
+        self.target_time = None  # Virtual time the robot first touched a target
+        self.distance_driven = 0.0
+        self.in_contact = None
+        self.was_inside = self.arena.inside(x, y)
+        self.timers = []  # SimTimers, run by advance() when they come due
+        self.running_timers = False
+
+    def wheel_speed(self, pwm_pin):
+        """Returns the speed of a wheel in cm/s, negative when reversing"""
+        speed = self.max_speed * self.duty[pwm_pin] / self.max_duty
+        return -speed if self.reverse[pwm_pin] else speed
+
+    def advance(self, seconds):
+        """Moves the clock forward, and drives the robot with the current wheel speeds.
+        Timers that come due on the way are run. Time they take counts as part of the seconds"""
+        with self.lock:
+            while seconds > 0:
+                step = min(seconds, STEP)
+                due = self.next_due()
+                if due is not None:
+                    step = min(step, max(due - self.time, 0.0))
+                self.integrate(step)
+                self.time += step
+                seconds -= step
+                if due is not None and self.time >= due:
+                    before = self.time
+                    self.run_timers()
+                    seconds -= self.time - before
+
+    def next_due(self):
+        """Virtual time the next timer is due, None if there are no timers or they are running"""
+        if not self.timers or self.running_timers:
+            return None
+        return min(timer.due for timer in self.timers)
+
+    def run_timers(self):
+        """Runs the timers that are due. Timers do not run while another timer is running"""
+        self.running_timers = True
+        try:
+            for timer in list(self.timers):
+                if timer.due <= self.time:
+                    start = timer.due
+                    timer.func()
+                    timer.due = max(start + timer.period, self.time)
+        finally:
+            self.running_timers = False
+
+    def integrate(self, step):
+        """Differential drive kinematics for one step. The robot stops against obstacles"""
+        left, right = self.wheel_speed(LEFT_PWM), self.wheel_speed(RIGHT_PWM)
+        if left == 0 and right == 0:
+            return
+        speed = (left + right) / 2
+        heading = self.heading + (right - left) / self.wheel_base * step
+        x = self.x + speed * math.cos(heading) * step
+        y = self.y + speed * math.sin(heading) * step
+        self.heading = heading
+        contact = self.contact(x, y)
+        if contact:
+            if contact.target:
+                if self.target_time is None:
+                    self.target_time = self.time
+            elif contact is not self.in_contact:
+                self.collisions += 1
+            self.in_contact = contact
+            return
+        self.in_contact = None
+        self.distance_driven += abs(speed) * step
+        self.x, self.y = x, y
+        inside = self.arena.inside(x, y)
+        if self.was_inside and not inside:
+            self.line_crossings += 1
+        self.was_inside = inside
+
+    def contact(self, x, y):
+        """Returns the obstacle the robot would touch at (x, y), None if it is free"""
+        for obstacle in self.arena.obstacles:
+            if math.hypot(obstacle.x - x, obstacle.y - y) < obstacle.radius + self.radius:
+                return obstacle
+        return None
+
+    def front_distance(self):
+        """Distance in cm from the front of the robot to the nearest obstacle in the ultrasonic cone"""
+        x = self.x + self.radius * math.cos(self.heading)
+        y = self.y + self.radius * math.sin(self.heading)
+        return min(self.arena.cast_ray(x, y, self.heading + spread)[0] for spread in (-0.13, 0.0, 0.13))
+
+    def reflectance_position(self, index):
+        """Position of reflectance sensor index (0 is leftmost)"""
+        lateral = (2.5 - index) * self.sensor_spread
+        x = self.x + self.sensor_offset * math.cos(self.heading) - lateral * math.sin(self.heading)
+        y = self.y + self.sensor_offset * math.sin(self.heading) + lateral * math.cos(self.heading)
+        return x, y
+
+    def discharge_time(self, index):
+        """Reflectance discharge time in seconds: 100 us on a light floor, 1000 us on the line"""
+        darkness = self.arena.floor_darkness(*self.reflectance_position(index))
+        return 0.0001 + 0.0009 * darkness
+
+    def render(self, width, height, fov=math.radians(60), object_height=10.0):
+        """Renders the camera view: one ray per column, obstacles drawn as colored bars"""
+        image = Image.new('RGB', (width, height), (170, 170, 190))
+        draw = ImageDraw.Draw(image)
+        horizon = height // 2
+        draw.rectangle([0, horizon, width, height], fill=(90, 90, 90))
+        focal = (width / 2) / math.tan(fov / 2)
+        for column in range(width):
+            offset = math.atan(((width / 2) - column - 0.5) / focal)  # Column 0 is to the left
+            distance, obstacle = self.arena.cast_ray(self.x, self.y, self.heading + offset)
+            if obstacle is None:
+                continue
+            bar = min(height, int(focal * object_height / max(distance * math.cos(offset), 0.1)))
+            draw.line([(column, horizon - bar // 2), (column, horizon + bar // 2)], fill=obstacle.color)
+        return image
+
+
+class SimTimer:
+    """Calls func every period seconds of virtual time, from World.advance (see SimBackend.start_periodic)"""
+
+    def __init__(self, world, period, func):
+        self.world = world
+        self.period = period
+        self.func = func
+        self.due = world.time
+        with world.lock:
+            world.timers.append(self)
+
+    def stop(self):
+        with self.world.lock:
+            if self in self.world.timers:
+                self.world.timers.remove(self)
+
+
+class SimGPIO:
+    """Stands in for the RPi.GPIO module"""
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, world):
+        self.world = world
+        self.levels = {}  # Output levels
+        self.discharge_start = {}  # Reflectance pin -> virtual time it was switched to input
+        self.echo = (0.0, 0.0)  # Virtual times the echo pin goes high and low again
+        self.event_detect = {}  # Pin -> [edge, callbacks, level, virtual time the level was last checked]
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def cleanup(self, *channels):
+        pass
+
+    def setup(self, channels, direction):
+        for channel in channels if isinstance(channels, (list, tuple)) else [channels]:
+            if direction == self.IN and channel in REFLECTANCE_PINS:
+                self.discharge_start[channel] = self.world.time
+
+    def output(self, channels, values):
+        channels = channels if isinstance(channels, (list, tuple)) else [channels]
+        values = values if isinstance(values, (list, tuple)) else [values] * len(channels)
+        for channel, value in zip(channels, values):
+            value = int(bool(value))
+            if channel == TRIG_PIN and self.levels.get(channel) and not value:
+                self.trigger()
+            self.levels[channel] = value
+
+    def trigger(self):
+        """The trigger pulse has ended: schedule the echo pulse"""
+        with self.world.lock:
+            rise = self.world.time + 0.0002  # The sensor sends its 40 kHz burst first
+            self.echo = (rise, rise + 2 * self.world.front_distance() / SPEED_OF_SOUND)
+
+    def input(self, channel):
+        self.world.advance(POLL_TIME)
+        return self.level(channel, self.world.time)
+
+    def level(self, channel, now):
+        """Level of an input pin at virtual time now"""
+        if channel == ECHO_PIN:
+            return int(self.echo[0] <= now < self.echo[1])
+        if channel in REFLECTANCE_PINS:
+            start = self.discharge_start.get(channel, now)
+            return int(now < start + self.world.discharge_time(REFLECTANCE_PINS.index(channel)))
+        if channel in IR_PROXIMITY_PINS:
+            return 1  # Nothing close
+        return self.levels.get(channel, 0)
+
+    def transitions(self, channel):
+        """Virtual times at which the level of an input pin changes, as far as they are known now"""
+        if channel == ECHO_PIN:
+            return list(self.echo)
+        if channel in self.discharge_start:
+            return [self.discharge_start[channel] + self.world.discharge_time(REFLECTANCE_PINS.index(channel))]
+        return []
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self.event_detect[channel] = [edge, [callback] if callback else [], self.level(channel, self.world.time),
+                                      self.world.time]
+
+    def add_event_callback(self, channel, callback):
+        self.event_detect[channel][1].append(callback)
+
+    def remove_event_detect(self, channel):
+        self.event_detect.pop(channel, None)
+
+    def next_event(self, deadline):
+        """Returns (virtual time, pin) of the first level change on a pin with event detection, up to deadline.
+        None if there is none"""
+        events = [(time, channel) for channel, detect in self.event_detect.items()
+                  for time in self.transitions(channel) if detect[3] < time <= deadline]
+        return min(events) if events else None
+
+    def fire(self, channel, time):
+        """Checks the level of a pin with event detection at a virtual time, and calls its callbacks on an edge"""
+        detect = self.event_detect[channel]
+        level = self.level(channel, time)
+        detect[3] = time
+        if level == detect[2]:
+            return
+        detect[2] = level
+        if detect[0] == self.BOTH or detect[0] == (self.RISING if level else self.FALLING):
+            for callback in list(detect[1]):
+                callback(channel)
+
+
+class SimWiringPi:
+    """Stands in for the wiringpi module"""
+
+    def __init__(self, world):
+        self.world = world
+
+    def wiringPiSetupGpio(self):
+        pass
+
+    def pinMode(self, pin, mode):
+        pass
+
+    def pullUpDnControl(self, pin, pud):
+        pass
+
+    def pwmWrite(self, pin, value):
+        with self.world.lock:
+            self.world.duty[pin] = value
+
+    def digitalWrite(self, pin, value):
+        with self.world.lock:
+            if pin == LEFT_DIR:
+                self.world.reverse[LEFT_PWM] = value
+            elif pin == RIGHT_DIR:
+                self.world.reverse[RIGHT_PWM] = value
+
+    def digitalRead(self, pin):
+        return 0  # The button reads low when pressed, and it is always pressed
+
+
+class SimBackend:
+    """Backend running everything against a World, on its virtual clock"""
+
+    def __init__(self, world=None):
+        self.world = world if world else World()
+        self.GPIO = SimGPIO(self.world)
+        self.wiringpi = SimWiringPi(self.world)
+
+    def sleep(self, seconds):
+        self.world.advance(seconds)
+
+    def monotonic(self):
+        return self.world.time
+
+    def monotonic_ns(self):
+        return round(self.world.time * 1e9)
+
+    def start_periodic(self, period, func):
+        """Background work runs in virtual time: func is called as the clock passes the times it is due"""
+        return SimTimer(self.world, period, func)
+
+    def wait_for(self, condition, predicate, timeout):
+        """Waits in virtual time, jumping from one GPIO edge to the next until predicate() is true"""
+        with condition:
+            deadline = self.world.time + timeout
+            while not predicate():
+                event = self.GPIO.next_event(deadline)
+                if event is None:
+                    self.world.advance(deadline - self.world.time)
+                    return predicate()
+                self.world.advance(max(0.0, event[0] - self.world.time))
+                self.GPIO.fire(event[1], event[0])
+            return True
+
+    def capture(self, width, height, rot):
+        with self.world.lock:  # The camera may be read from a background thread
+            image = self.world.render(width, height)
+        return image.rotate(rot, expand=True) if rot else image
+
+    def open_stream(self, width, height, rot):
+        return SimFrameStream(self, width, height, rot)
+
+
+class SimFrameStream:
+    """Camera stream of the simulator. Every frame is rendered when it is asked for, so it is always the latest"""
+
+    def __init__(self, sim_backend, width, height, rot):
+        self.sim_backend = sim_backend
+        self.width = width
+        self.height = height
+        self.rot = rot
+
+    def get_frame(self, newer_than=0, timeout=5.0):
+        return self.sim_backend.capture(self.width, self.height, self.rot)
+
+    def close(self):
+        pass
+
+
+def main():
+    """Runs the controller in the simulator until it halts, and prints the outcome"""
+    import backend
+    sim = backend.use('sim')
+    import bbcon
+    bbcon.main(tick_rate=10, telemetry_path=None)
+    world = sim.world
+    print('Simulated time: {:.1f} s, target hit at: {}, line crossings: {}, collisions: {}'.format(
+        world.time, world.target_time, world.line_crossings, world.collisions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Parallel parameter sweep over the behavior priorities and thresholds. Every configuration drives the controller
+in the simulator (see simulator.py) through a set of scenarios, on a process pool, and the configurations are
+ranked by outcome: time until the target is hit, line crossings and collisions.
+
+    python sweep.py [-p processes] [-n top] [-o results.json]
+
+A configuration maps 'BehaviorClass.attribute' to a value, e.g. {'AvoidLineBehaviour.priority': 4}"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import sys
+import backend
+import simulator
+
+# The # Tweak constants of behavior.py, and the values tried for each of them
+DEFAULT_GRID = {
+    'AvoidLineBehaviour.priority': [2, 4, 8],
+    'AvoidLineBehaviour.line_threshold': [0.2, 0.3, 0.5],
+    'CollisionDetectionBehaviour.distance_threshold': [4, 6, 10],
+    'CollisionDetectionBehaviour.predict_contact': [False, True],
+    'AvoidObstacleBehaviour.distance_scale': [25, 50],
+    'AttackBehaviour.green_threshold': [0.05, 0.1, 0.2],
+}
+
+# Start poses (x, y, heading) in the default arena
+DEFAULT_SCENARIOS = [(40.0, 40.0, 0.0), (40.0, 110.0, -0.6), (110.0, 110.0, math.pi), (75.0, 75.0, 1.0)]
+
+MAX_TIME = 120.0  # Simulated seconds before a scenario is given up
+FOLLOW_THROUGH_TIME = 10.0  # Simulated seconds the last motor command is kept up after a halt request
+LINE_PENALTY = 30.0  # Seconds added to the score per line crossing
+COLLISION_PENALTY = 10.0  # Seconds added to the score per collision
+
+
+def configurations(grid):
+    """Returns every combination of the values in the grid, as configurations"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def apply_configuration(controller, configuration):
+    """Sets the configured attributes on the behaviors of a controller"""
+    for key, value in configuration.items():
+        class_name, attribute = key.split('.')
+        for this_behavior in controller.behaviors:
+            if type(this_behavior).__name__ == class_name:
+                setattr(this_behavior, attribute, value)
+                this_behavior.update_weight()
+
+
+def run_scenario(configuration, pose, max_time=MAX_TIME):
+    """Runs the controller with a configuration from one start pose, and returns the outcome"""
+    sim = backend.use('sim', world=simulator.World(x=pose[0], y=pose[1], heading=pose[2]))
+    import bbcon
+    controller = bbcon.Bbcon()
+    apply_configuration(controller, configuration)
+    world = sim.world
+    while world.time < max_time and world.target_time is None and not controller.halt_request:
+        controller.run_one_timestep()
+    follow_through(controller, world, min(max_time, world.time + FOLLOW_THROUGH_TIME))
+    controller.telemetry.close()
+    return {'target_time': world.target_time, 'line_crossings': world.line_crossings,
+            'collisions': world.collisions, 'halted': controller.halt_request, 'time': world.time}
+
+
+def follow_through(controller, world, end_time):
+    """AttackBehaviour requests a halt as it charges, before the robot reaches the target. Keeps driving with the
+    last motor recommendation until the robot touches something or end_time, so the charge is scored"""
+    if not controller.halt_request or len(controller.motor_recs) == 1:
+        return
+    collisions = world.collisions
+    while world.time < end_time and world.target_time is None and world.collisions == collisions:
+        controller.motobs.update(controller.motor_recs)
+
+
+def score(outcomes):
+    """Lower is better: the time to hit the target (MAX_TIME if it was not hit) plus penalties, summed"""
+    total = 0.0
+    for outcome in outcomes:
+        total += outcome['target_time'] if outcome['target_time'] is not None else MAX_TIME
+        total += LINE_PENALTY * outcome['line_crossings'] + COLLISION_PENALTY * outcome['collisions']
+    return total
+
+
+def evaluate(configuration, scenarios=DEFAULT_SCENARIOS):
+    """Runs one configuration through all scenarios. This is what the pool workers run"""
+    outcomes = [run_scenario(configuration, pose) for pose in scenarios]
+    return {'configuration': configuration, 'score': score(outcomes),
+            'targets_hit': sum(outcome['target_time'] is not None for outcome in outcomes),
+            'line_crossings': sum(outcome['line_crossings'] for outcome in outcomes),
+            'collisions': sum(outcome['collisions'] for outcome in outcomes),
+            'outcomes': outcomes}
+
+
+def sweep(grid=None, processes=None):
+    """Evaluates every configuration of the grid on a process pool (one process per core by default),
+    and returns the results ranked best first"""
+    grid = grid if grid else DEFAULT_GRID
+    with multiprocessing.Pool(processes) as pool:
+        results = list(pool.imap_unordered(evaluate, configurations(grid)))
+    return sorted(results, key=lambda result: result['score'])
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Parameter sweep over behavior priorities and thresholds')
+    parser.add_argument('-p', '--processes', type=int, help='worker processes, one per core by default')
+    parser.add_argument('-n', '--top', type=int, default=10, help='number of configurations to print')
+    parser.add_argument('-o', '--output', help='file the ranked results are written to as JSON')
+    args = parser.parse_args(argv)
+    results = sweep(processes=args.processes)
+    for rank, result in enumerate(results[:args.top], 1):
+        print('{:3d}. score {:8.1f}  targets hit {}  line crossings {}  collisions {}  {}'.format(
+            rank, result['score'], result['targets_hit'], result['line_crossings'], result['collisions'],
+            result['configuration']))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
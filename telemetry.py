@@ -0,0 +1,156 @@
+"""Binary telemetry for the control loop. Every timestep is stored as a fixed-size record in a
+preallocated ring buffer, which a background thread flushes to disk. Nothing is formatted in the loop itself;
+run `python telemetry.py <file>` to turn a telemetry file into a readable log"""
+import math
+import struct
+import sys
+import threading
+import numpy as np
+
+MAGIC = b'PLABTLM1'
+HEADER = struct.Struct('<HHI')  # number of behaviors, number of sensobs, length of the names block
+NAN = float('nan')
+
+
+FIXED = struct.Struct('<Ii?cff')  # The fields of a record before the weights and sensob values
+
+
+def record_struct(n_behaviors, n_sensobs):
+    """Returns the Struct of one record: tick, winner index, halt request, motor direction, motor speed,
+    right wheel speed (of "V" recommendations, nan for the others), the weight of every behavior and the value of
+    every sensob"""
+    return struct.Struct(FIXED.format + 'f' * (n_behaviors + n_sensobs))
+
+
+class Telemetry:
+    """Ring buffer of fixed-size binary records, flushed to a file by a background thread.
+    If the flusher falls behind, the oldest records are overwritten and counted as dropped"""
+
+    def __init__(self, behavior_names, sensob_names, path=None, capacity=4096, flush_interval=1.0):
+        """behavior_names, sensob_names: the names stored in the file header, in record order.
+        path: the file the records are flushed to. None keeps the last `capacity` records in memory only"""
+        self.behavior_names = list(behavior_names)
+        self.sensob_names = list(sensob_names)
+        self.record = record_struct(len(self.behavior_names), len(self.sensob_names))
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * self.record.size)
+        self.written = 0  # Number of records written to the buffer
+        self.flushed = 0  # Number of records flushed to disk or dropped
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.file = None
+        self.flusher = None
+        self.stop_event = threading.Event()
+        self.flush_interval = flush_interval
+        if path:
+            self.file = open(path, 'wb')
+            self.write_header()
+            self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+            self.flusher.start()
+
+    def write_header(self):
+        """Writes the magic bytes, the counts and the behavior and sensob names to the file"""
+        names = '\n'.join(self.behavior_names + self.sensob_names).encode('utf-8')
+        self.file.write(MAGIC + HEADER.pack(len(self.behavior_names), len(self.sensob_names), len(names)) + names)
+
+    def log(self, tick, winner_index, halt_request, motor_recs, weights, sensob_values):
+        """Stores one timestep in the ring buffer. Called once per timestep from the control loop.
+        weights may be a NumPy array, it is copied into the record in one operation"""
+        direction = motor_recs[0].encode('ascii') if motor_recs else b'-'
+        speed = motor_recs[1] if len(motor_recs) > 1 else NAN
+        right_speed = motor_recs[2] if len(motor_recs) > 2 else NAN
+        with self.lock:
+            if self.written - self.flushed >= self.capacity:
+                self.flushed += 1
+                self.dropped += 1
+            offset = (self.written % self.capacity) * self.record.size
+            FIXED.pack_into(self.buffer, offset, tick, winner_index, halt_request, direction, speed, right_speed)
+            floats = np.ndarray(len(self.behavior_names) + len(self.sensob_names), '<f4', self.buffer,
+                                offset + FIXED.size)
+            floats[:len(self.behavior_names)] = weights
+            floats[len(self.behavior_names):] = sensob_values
+            self.written += 1
+
+    def take_pending(self):
+        """Returns the bytes of the records not yet flushed, and marks them as flushed"""
+        with self.lock:
+            start = self.flushed % self.capacity
+            count = self.written - self.flushed
+            end = start + count
+            size = self.record.size
+            if end <= self.capacity:
+                pending = bytes(self.buffer[start * size:end * size])
+            else:
+                pending = bytes(self.buffer[start * size:]) + bytes(self.buffer[:(end - self.capacity) * size])
+            self.flushed = self.written
+        return pending
+
+    def flush(self):
+        """Writes the pending records to the file"""
+        pending = self.take_pending()
+        if pending:
+            self.file.write(pending)
+            self.file.flush()
+
+    def flush_loop(self):
+        """Body of the background flusher thread"""
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the flusher, flushes what is left and closes the file"""
+        if self.file:
+            self.stop_event.set()
+            self.flusher.join()
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def get_records(self):
+        """Returns the records still held in the buffer as dictionaries, oldest first"""
+        with self.lock:
+            first = max(self.flushed if self.file else 0, self.written - self.capacity)
+            raw = [self.record.unpack_from(self.buffer, (i % self.capacity) * self.record.size)
+                   for i in range(first, self.written)]
+        return [unpack_record(fields, self.behavior_names, self.sensob_names) for fields in raw]
+
+
+def unpack_record(fields, behavior_names, sensob_names):
+    """Turns the unpacked fields of a record into a dictionary"""
+    n_behaviors = len(behavior_names)
+    weights = fields[6:6 + n_behaviors]
+    values = fields[6 + n_behaviors:]
+    winner = behavior_names[fields[1]] if fields[1] >= 0 else None
+    motor_recs = [fields[3].decode('ascii')] + [speed for speed in fields[4:6] if not math.isnan(speed)]
+    return {'tick': fields[0], 'winner': winner, 'halt_request': fields[2], 'motor_recs': motor_recs,
+            'weights': dict(zip(behavior_names, weights)), 'sensob_values': dict(zip(sensob_names, values))}
+
+
+def read(path):
+    """Generator over the records of a telemetry file, as dictionaries"""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + ' is not a telemetry file')
+        n_behaviors, n_sensobs, names_length = HEADER.unpack(file.read(HEADER.size))
+        names = file.read(names_length).decode('utf-8').split('\n')
+        behavior_names, sensob_names = names[:n_behaviors], names[n_behaviors:]
+        record = record_struct(n_behaviors, n_sensobs)
+        while True:
+            data = file.read(record.size)
+            if len(data) < record.size:  # A partly written last record is ignored
+                break
+            yield unpack_record(record.unpack(data), behavior_names, sensob_names)
+
+
+def decode(path):
+    """Generator over the records of a telemetry file, as readable log lines"""
+    for entry in read(path):
+        weights = ' '.join('{}={:.3g}'.format(name, weight) for name, weight in entry['weights'].items())
+        values = ' '.join('{}={:.3g}'.format(name, value) for name, value in entry['sensob_values'].items())
+        yield 'tick {:6d}  winner: {}  motor_recs: {}  halt: {}  weights: {}  sensobs: {}'.format(
+            entry['tick'], entry['winner'], entry['motor_recs'], entry['halt_request'], weights, values)
+
+
+if __name__ == '__main__':
+    for line in decode(sys.argv[1]):
+        print(line)
@@ -0,0 +1,6 @@
+"""The modules live at the top of the repository, and the tests run against the simulator backend"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PLAB_BACKEND', 'sim')
@@ -0,0 +1,171 @@
+import random
+import pytest
+import arbitrator
+
+
+def linear_find(weights, value):
+    """The index whose cumulative range [prefix, prefix + weight) covers value, by scanning"""
+    prefix = 0.0
+    for index, weight in enumerate(weights):
+        if prefix <= value < prefix + weight:
+            return index
+        prefix += weight
+    return len(weights) - 1
+
+
+def check_against_scan(tree, weights):
+    assert len(tree) == len(weights)
+    for count in range(len(weights) + 1):
+        assert tree.prefix_sum(count) == sum(weights[:count])
+    assert tree.total() == sum(weights)
+    prefix = 0.0
+    for weight in weights:
+        for value in (prefix, prefix + weight / 2):
+            if value < sum(weights):
+                assert tree.find(value) == linear_find(weights, value)
+        prefix += weight
+
+
+def test_fenwick_append_set_find_match_linear_scan():
+    rng = random.Random(3)
+    tree = arbitrator.FenwickTree()
+    weights = []
+    for _ in range(50):
+        weight = float(rng.randint(0, 9))
+        assert tree.append(weight) == len(weights)
+        weights.append(weight)
+        check_against_scan(tree, weights)
+    for _ in range(200):
+        index = rng.randrange(len(weights))
+        weights[index] = float(rng.randint(0, 9))
+        tree.set(index, weights[index])
+    check_against_scan(tree, weights)
+
+
+def test_fenwick_find_skips_zero_weights():
+    tree = arbitrator.FenwickTree()
+    for weight in (0.0, 2.0, 0.0, 0.0, 1.0):
+        tree.append(weight)
+    assert tree.find(0.0) == 1
+    assert tree.find(1.9) == 1
+    assert tree.find(2.0) == 4
+
+
+class FakeBehavior:
+    def __init__(self, name, weight, motor_recs=("F", 0.5), halt_request=False):
+        self.name = name
+        self.weight = weight
+        self.motor_recs = list(motor_recs)
+        self.halt_request = halt_request
+
+    def get_weight(self):
+        return self.weight
+
+    def get_motor_recs(self):
+        return self.motor_recs
+
+    def get_halt_request(self):
+        return self.halt_request
+
+
+class FakeBbcon:
+    def __init__(self):
+        self.active_behaviors = []
+
+
+def make_arbitrators(behaviors, mode, seed=None):
+    """Returns (reference Arbitrator, IndexedArbitrator) over the same active behaviors, in registration order"""
+    this_bbcon = FakeBbcon()
+    reference = arbitrator.Arbitrator(this_bbcon, mode == 'deterministic')
+    indexed = arbitrator.IndexedArbitrator(this_bbcon, mode, seed=seed)
+    for this_behavior in behaviors:
+        this_bbcon.active_behaviors.append(this_behavior)
+        indexed.behavior_activated(this_behavior)
+    return this_bbcon, reference, indexed
+
+
+def set_weight(indexed, this_behavior, weight):
+    this_behavior.weight = weight
+    indexed.weight_changed(this_behavior)
+
+
+def test_deterministic_mode_picks_the_reference_winner():
+    rng = random.Random(5)
+    behaviors = [FakeBehavior('B' + str(i), float(rng.randint(0, 5)), ("F", i / 20.0)) for i in range(20)]
+    this_bbcon, reference, indexed = make_arbitrators(behaviors, 'deterministic')
+    for _ in range(300):
+        action = rng.random()
+        this_behavior = rng.choice(behaviors)
+        if action < 0.6:
+            set_weight(indexed, this_behavior, float(rng.randint(0, 5)))  # Small integers, so ties happen
+        elif this_behavior in this_bbcon.active_behaviors and len(this_bbcon.active_behaviors) > 1:
+            this_bbcon.active_behaviors.remove(this_behavior)
+            indexed.behavior_deactivated(this_behavior)
+        elif this_behavior not in this_bbcon.active_behaviors:
+            this_bbcon.active_behaviors.append(this_behavior)
+            this_bbcon.active_behaviors.sort(key=behaviors.index)
+            indexed.behavior_activated(this_behavior)
+        assert indexed.choose_action() == reference.choose_action()
+        assert indexed.winner is reference.winner
+
+
+def test_stochastic_mode_draws_proportionally_to_weight():
+    behaviors = [FakeBehavior('B' + str(i), weight) for i, weight in enumerate([1.0, 0.0, 3.0, 6.0])]
+    _, reference, indexed = make_arbitrators(behaviors, 'stochastic', seed=11)
+    random.seed(11)
+    draws = 20000
+    for this_arbitrator in (indexed, reference):
+        counts = dict.fromkeys(behaviors, 0)
+        for _ in range(draws):
+            this_arbitrator.choose_action()
+            counts[this_arbitrator.winner] += 1
+        assert counts[behaviors[1]] == 0
+        for this_behavior in behaviors:
+            assert abs(counts[this_behavior] / draws - this_behavior.weight / 10.0) < 0.015
+
+
+def test_blended_mode_passes_stops_and_halts_through():
+    cruise = FakeBehavior('Cruise', 1.0, ("F", 0.6))
+    turn = FakeBehavior('Turn', 1.0, ("L", 0.4))
+    stop = FakeBehavior('Stop', 5.0, ["S"])
+    _, _, indexed = make_arbitrators([cruise, turn, stop], 'blended')
+    assert indexed.choose_action() == [["S"], False]
+    assert indexed.winner is stop
+
+    set_weight(indexed, stop, 0.5)
+    stop.motor_recs = ["F", 0.2]
+    motor_recs, halt_request = indexed.choose_action()
+    assert motor_recs[0] == "V" and not halt_request
+    assert motor_recs[1] == pytest.approx((0.6 - 0.4 + 0.5 * 0.2) / 2.5)
+    assert motor_recs[2] == pytest.approx((0.6 + 0.4 + 0.5 * 0.2) / 2.5)
+
+    stop.halt_request = True
+    set_weight(indexed, stop, 5.0)
+    assert indexed.choose_action() == [["F", 0.2], True]
+
+
+def test_bulk_updates_match_one_by_one_updates():
+    rng = random.Random(8)
+    behaviors = [FakeBehavior('B' + str(i), float(rng.randint(1, 9))) for i in range(64)]
+    _, _, one_by_one = make_arbitrators(behaviors, 'deterministic')
+    _, _, bulk = make_arbitrators(behaviors, 'deterministic')
+    for _ in range(20):
+        changed = rng.sample(behaviors, rng.choice([2, 40]))  # Below and above the rebuild threshold
+        for this_behavior in changed:
+            this_behavior.weight = float(rng.randint(1, 9))
+        for this_behavior in changed:
+            one_by_one.weight_changed(this_behavior)
+        bulk.weights_changed(changed)
+        switched = rng.sample(behaviors, rng.choice([3, 50]))
+        if rng.random() < 0.5:
+            for this_behavior in switched:
+                one_by_one.behavior_deactivated(this_behavior)
+            bulk.behaviors_deactivated(switched)
+        else:
+            for this_behavior in switched:
+                one_by_one.behavior_activated(this_behavior)
+            bulk.behaviors_activated(switched)
+        assert bulk.tree.weights == one_by_one.tree.weights
+        for count in range(len(behaviors) + 1):
+            assert abs(bulk.tree.prefix_sum(count) - one_by_one.tree.prefix_sum(count)) < 1e-9
+        assert bulk.heaviest(5) == one_by_one.heaviest(5)
@@ -0,0 +1,120 @@
+import math
+import pytest
+import backend
+import simulator
+
+backend.use('sim', world=simulator.World())
+import bbcon  # noqa: E402  The sensobs of behavior.py are built on the backend selected above
+import behavior  # noqa: E402
+import behavior_table  # noqa: E402
+import sensob  # noqa: E402
+
+
+class FakeSensor:
+    """Stands in for the sensors of a sensob. The tests set the sensob values directly"""
+
+    def get_value(self):
+        return None
+
+    def update(self):
+        return None
+
+    def reset(self):
+        pass
+
+
+def fake_sensob():
+    this_sensob = sensob.Sensob()
+    this_sensob.sensors = FakeSensor()
+    return this_sensob
+
+
+def make_table(rows, arbitration_mode=None):
+    """Returns (controller, table) for rows added to a controller"""
+    controller = bbcon.Bbcon(arbitration_mode=arbitration_mode, behavior_rows=rows)
+    controller.telemetry.close()
+    return controller, controller.behavior_tables[0]
+
+
+def row(name, this_sensob, **definition):
+    return dict({'name': name, 'sensob': this_sensob, 'motor_recs': ["S"]}, **definition)
+
+
+def states(controller, table, values):
+    """Sets the values of the sensobs of the table in turn, and returns whether each row was active after each"""
+    result = []
+    for value in values:
+        for this_sensob in table.sensobs:
+            this_sensob.set_value(value)
+        table.update()
+        result.append([this_behavior in controller.active_behaviors for this_behavior in table.behaviors])
+    return result
+
+
+def test_below_and_above_rows():
+    distance = fake_sensob()
+    controller, table = make_table([row('Near', distance, when='below', on=10, gain=-0.1, offset=2.0, priority=3),
+                                    row('Far', distance, when='above', on=50)])
+    assert states(controller, table, [5, 30, 60]) == [[True, False], [False, False], [False, True]]
+    near, far = table.behaviors
+    assert near.get_weight() == pytest.approx(3 * (-0.1 * 60 + 2.0))
+    assert far.get_weight() == 60.0
+    assert far.active_flag and not near.active_flag
+
+
+def test_hysteresis():
+    distance = fake_sensob()
+    controller, table = make_table([row('Near', distance, when='below', on=10, off=15),
+                                    row('Far', distance, when='above', on=50, off=40)])
+    near = [active[0] for active in states(controller, table, [9, 12, 16, 12, 10])]
+    assert near == [True, True, False, False, True]
+    far = [active[1] for active in states(controller, table, [51, 45, 39, 45, 50])]
+    assert far == [True, True, False, False, True]
+
+
+def test_rows_without_a_sample_keep_their_activation():
+    distance = fake_sensob()
+    controller, table = make_table([row('Near', distance, when='below', on=10)])
+    assert states(controller, table, [5, None, 20, None]) == [[True], [True], [False], [False]]
+    assert table.behaviors[0].get_weight() == 0.0
+    assert math.isnan(table.sensob_values()[0])
+
+
+def test_unknown_keys_and_directions_are_refused():
+    with pytest.raises(ValueError):
+        behavior_table.BehaviorTable(None, [row('Near', fake_sensob(), when='below', on=1, colour='red')])
+    with pytest.raises(ValueError):
+        behavior_table.BehaviorTable(None, [row('Near', fake_sensob(), when='beside', on=1)])
+
+
+def test_row_agrees_with_avoid_line_behaviour():
+    controller, table = make_table([behavior_table.EXAMPLE_ROWS[0]])
+    avoid_line = next(b for b in controller.behaviors if isinstance(b, behavior.AvoidLineBehaviour))
+    row_behavior = table.behaviors[0]
+    for darkest in [0.9, 0.5, 0.3, 0.1, 0.31, 0.6, 0.2, 1.0]:
+        behavior.IR_SENSOB.set_value([darkest, 1.0, 1.0, 1.0, 1.0, 1.0])
+        table.update()
+        avoid_line.update()
+        assert row_behavior.active_flag == avoid_line.active_flag
+        assert (row_behavior in controller.active_behaviors) == (avoid_line in controller.active_behaviors)
+        assert row_behavior.get_weight() == pytest.approx(avoid_line.get_weight())
+        weights = controller.get_weights()
+        assert weights[controller.behavior_indices[row_behavior]] == pytest.approx(avoid_line.get_weight())
+
+
+def test_many_rows_keep_the_indexed_arbitrator_in_step():
+    distance = fake_sensob()
+    rows = [row('Row' + str(i), distance, when='below', on=i, gain=-1.0, offset=200.0, priority=1 + i % 3)
+            for i in range(200)]
+    controller, table = make_table(rows, arbitration_mode='deterministic')
+    arbitrator = controller.arbitrator
+    for value in [150, 20, 180, 5]:
+        distance.set_value(value)
+        table.update()
+        for this_behavior in table.behaviors:
+            index = arbitrator.indices[this_behavior]
+            expected = this_behavior.get_weight() if this_behavior.active_flag else 0.0
+            assert arbitrator.tree.weights[index] == expected
+            assert arbitrator.tree.prefix_sum(index + 1) == pytest.approx(sum(arbitrator.tree.weights[:index + 1]))
+        heaviest = max(table.behaviors, key=lambda b: b.get_weight() if b.active_flag else -1)
+        assert arbitrator.behaviors[arbitrator.heaviest(1)[0]].get_weight() == heaviest.get_weight()
@@ -0,0 +1,49 @@
+import math
+import numpy as np
+import pytest
+from PIL import Image
+import color_classifier
+
+GREEN_PIXEL = (30, 200, 40)
+GRAY_PIXEL = (90, 90, 90)
+
+
+def picture(green_fraction, width=128, height=96, seed=0):
+    """A picture with about green_fraction of its pixels green, scattered at random"""
+    rng = np.random.default_rng(seed)
+    green = rng.random((height, width)) < green_fraction
+    pixels = np.where(green[..., None], GREEN_PIXEL, GRAY_PIXEL).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def classifier():
+    return color_classifier.ColorClassifier([color_classifier.GREEN], seed=1)
+
+
+def test_estimate_agrees_with_exact_count_far_from_threshold():
+    for fraction, threshold in ((0.6, 0.1), (0.02, 0.3), (0.9, 0.5)):
+        image = picture(fraction)
+        exact = classifier().fractions(image)['green'] >= threshold
+        estimate = classifier().estimate(image, 'green', threshold)
+        assert estimate.exceeds == exact
+        assert not estimate.exact and estimate.samples < 128 * 96
+
+
+def test_estimate_falls_back_to_exact_count_near_threshold():
+    image = picture(0.3)
+    exact = classifier().fractions(image)['green']
+    estimate = classifier().estimate(image, 'green', exact)
+    assert estimate.exact and estimate.samples == 128 * 96
+    assert estimate.fraction == exact and estimate.exceeds
+
+
+def test_estimate_error_bound_covers_every_look():
+    estimate = classifier().estimate(picture(0.6), 'green', 0.1, delta=0.01, batch=256, max_samples=4096)
+    looks = 4096 // 256
+    assert estimate.error == pytest.approx(math.sqrt(math.log(2 * looks / 0.01) / (2 * estimate.samples)))
+
+
+def test_small_pictures_are_counted_exactly():
+    image = picture(0.5, width=8, height=8)
+    estimate = classifier().estimate(image, 'green', 0.1)
+    assert estimate.exact and estimate.samples == 64
@@ -0,0 +1,36 @@
+import frame_stream
+
+
+def test_fake_producer_frames():
+    stream = frame_stream.FrameStream(frame_stream.fake_command(32, 24, 60), 32, 24)
+    try:
+        number, first = stream.get_frame_bytes()
+        later, _ = stream.get_frame_bytes(number)
+        image = stream.get_frame()
+    finally:
+        stream.close()
+    assert len(first) == 32 * 24 * 3
+    assert later > number
+    assert image.size == (32, 24)
+    assert image.getpixel((31, 23)) in ((0x5a, 0x5a, 0x5a), (0x1e, 0xb4, 0x28))
+
+
+def test_padded_frames_are_cropped():
+    width, height = 20, 10
+    padded = frame_stream.padded_size(width, height)
+    assert padded == (32, 16)
+    stream = frame_stream.FrameStream(frame_stream.fake_command(*padded, 60), width, height, padded)
+    try:
+        assert stream.get_frame().size == (width, height)
+    finally:
+        stream.close()
+
+
+def test_latency_of_fake_producer():
+    stream = frame_stream.FrameStream(frame_stream.fake_command(32, 24, 100), 32, 24)
+    try:
+        latencies = frame_stream.measure_latency(stream, 5)
+    finally:
+        stream.close()
+    assert len(latencies) == 5
+    assert all(0 <= latency < 1.0 for latency in latencies)
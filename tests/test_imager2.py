@@ -0,0 +1,174 @@
+import random
+import pytest
+from PIL import Image
+import imager2
+
+
+def random_image(mode, width=23, height=17, seed=1):
+    """An image of a few pixel values only, so it has ties between bands, black pixels and repeated pixels"""
+    rng = random.Random(seed)
+    levels = [0, 0, 1, 60, 60, 128, 255]
+    image = Image.new(mode, (width, height))
+    for x in range(width):
+        for y in range(height):
+            if mode == 'L':
+                image.putpixel((x, y), rng.choice(levels))
+            else:
+                image.putpixel((x, y), tuple(rng.choice(levels) for _ in range(3)))
+    return image
+
+
+def same_pixels(image1, image2):
+    return image1.mode == image2.mode and image1.size == image2.size and image1.tobytes() == image2.tobytes()
+
+
+# The pixel by pixel algorithms of the original Imager, which the NumPy versions must match exactly
+
+def baseline_map_image2(func, image):
+    im2 = image.copy()
+    for i in range(image.size[0]):
+        for j in range(image.size[1]):
+            im2.putpixel((i, j), func(im2.getpixel((i, j))))
+    return im2
+
+
+def baseline_map_color_wta(image, thresh):
+    def wta(p):
+        s = sum(p)
+        w = max(p)
+        if s > 0 and w / s >= thresh:
+            return tuple([(x if x == w else 0) for x in p])
+        else:
+            return (0, 0, 0)
+    return baseline_map_image2(wta, image)
+
+
+def baseline_morph(image1, image2, alpha):
+    im3 = Image.new('RGB', image1.size)
+    for x in range(image1.size[0]):
+        for y in range(image1.size[1]):
+            p1 = image1.getpixel((x, y))
+            p2 = image2.getpixel((x, y))
+            im3.putpixel((x, y), tuple([round(alpha * p1[i] + (1 - alpha) * p2[i]) for i in range(3)]))
+    return im3
+
+
+def test_map_image2_matches_the_pixel_loop():
+    rgb = random_image('RGB')
+    swap = lambda p: (p[2], p[0] // 2, 255 - p[1])
+    assert same_pixels(imager2.Imager(image=rgb).map_image2(swap).image, baseline_map_image2(swap, rgb))
+    gray = random_image('L', seed=2)
+    invert = lambda p: 255 - p if p > 50 else p // 3
+    assert same_pixels(imager2.Imager(image=gray).map_image2(invert).image, baseline_map_image2(invert, gray))
+
+
+@pytest.mark.parametrize('thresh', [0, 0.34, 0.5, 1])
+def test_map_color_wta_matches_the_pixel_loop(thresh):
+    rgb = random_image('RGB', seed=3)
+    assert same_pixels(imager2.Imager(image=rgb).map_color_wta(thresh=thresh).image,
+                       baseline_map_color_wta(rgb, thresh))
+    # The original only took RGB pixels; an L image is taken as the gray RGB image it converts to
+    gray = random_image('L', seed=4)
+    assert same_pixels(imager2.Imager(image=gray, mode='L').map_color_wta(thresh=thresh).image,
+                       baseline_map_color_wta(gray.convert('RGB'), thresh))
+
+
+@pytest.mark.parametrize('alpha', [0.5, 0.66, 0.33, 0.25])
+def test_morph_matches_the_pixel_loop(alpha):
+    rgb1 = random_image('RGB', seed=5)
+    rgb2 = random_image('RGB', seed=6)
+    assert same_pixels(imager2.Imager(image=rgb1).morph(imager2.Imager(image=rgb2), alpha).image,
+                       baseline_morph(rgb1, rgb2, alpha))
+    gray1 = random_image('L', seed=7)
+    gray2 = random_image('L', seed=8)
+    assert same_pixels(imager2.Imager(image=gray1).morph(imager2.Imager(image=gray2), alpha).image,
+                       baseline_morph(gray1.convert('RGB'), gray2.convert('RGB'), alpha))
+
+
+def concatenated(frames, vertical):
+    """The panorama of the original shoot_panorama: frames concatenated one by one"""
+    panorama = frames[0]
+    for frame in frames[1:]:
+        panorama = panorama.concat_vert(frame) if vertical else panorama.concat_horiz(frame)
+    return panorama
+
+
+@pytest.mark.parametrize('vertical', [False, True])
+@pytest.mark.parametrize('announced', [0, 3, 6, 9])
+def test_panorama_builder_matches_concatenation(vertical, announced):
+    sizes = [(12, 9), (12, 9), (7, 11), (15, 4), (12, 9), (3, 3)]
+    frames = [imager2.Imager(image=random_image('RGB', width, height, seed=10 + i))
+              for i, (width, height) in enumerate(sizes)]
+    builder = imager2.PanoramaBuilder(frames=announced, vertical=vertical)
+    for frame in frames:
+        builder.add(frame)
+    panorama = builder.get_imager()
+    expected = concatenated(frames, vertical)
+    assert (panorama.xmax, panorama.ymax) == (expected.xmax, expected.ymax)
+    assert same_pixels(panorama.image, expected.image)
+
+
+def test_panorama_builder_takes_pil_images():
+    frames = [random_image('RGB', 8, 5, seed=20 + i) for i in range(4)]
+    builder = imager2.PanoramaBuilder(frames=4)
+    for frame in frames:
+        builder.add(frame)
+    assert same_pixels(builder.get_imager().image,
+                       concatenated([imager2.Imager(image=frame) for frame in frames], False).image)
+
+
+def eager_chain(imager):
+    """The chain of test_lazy_chain run by Imager, one operation after the other"""
+    darken = imager.map_image(lambda v: v // 2 + 10)
+    contrast = darken.map_image(lambda v: min(255, v * 3))
+    small = contrast.resize(9, 6, resample=Image.NEAREST)
+    return small.map_color_wta(thresh=0.5).scale_colors(degree=0.7)
+
+
+def test_lazy_chain_matches_imager():
+    original = random_image('RGB', seed=30)
+    lazy = eager_chain(imager2.LazyImager(image=original.copy()))
+    assert isinstance(lazy, imager2.LazyImager) and lazy.ops
+    assert (lazy.xmax, lazy.ymax) == (9, 6)
+    assert same_pixels(lazy.image, eager_chain(imager2.Imager(image=original.copy())).image)
+
+
+def test_lazy_chain_is_not_changed_by_its_parent():
+    original = random_image('RGB', seed=31)
+    expected = eager_chain(imager2.Imager(image=original.copy())).image
+    parent = imager2.LazyImager(image=original.copy())
+    chain = eager_chain(parent)
+    parent.set_pixel(0, 0, (255, 255, 255))
+    parent.paste(imager2.Imager(width=5, height=5, background='red'), 3, 2)
+    assert parent.get_pixel(0, 0) == (255, 255, 255) and parent.get_pixel(4, 3) == (255, 0, 0)
+    assert same_pixels(chain.image, expected)
+
+
+def test_lazy_chain_is_not_changed_by_an_intermediate_imager():
+    original = random_image('RGB', seed=32)
+    parent = imager2.LazyImager(image=original.copy())
+    darken = parent.map_image(lambda v: v // 2)
+    leaf = darken.map_image(lambda v: 255 - v)
+    darken.set_pixel(1, 1, (0, 0, 0))
+    eager_darken = imager2.Imager(image=original.copy()).map_image(lambda v: v // 2)
+    assert same_pixels(leaf.image, eager_darken.map_image(lambda v: 255 - v).image)
+    assert darken.get_pixel(1, 1) == (0, 0, 0)
+    assert same_pixels(parent.image, original)
+
+
+def test_reformat_batch_reports_the_files_it_cannot_reformat(tmp_path, capsys):
+    for i in range(3):
+        random_image('RGB', 10, 8, seed=40 + i).save(str(tmp_path / 'frame{}.png'.format(i)))
+    (tmp_path / 'notes.png').write_text('not an image')
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    timings = imager2.reformat_batch(str(tmp_path), 'gif', 0.5, 0.5, out_dir=str(out_dir), processes=2)
+    assert len(timings) == 4
+    failed = [timing for timing in timings if timing[3]]
+    assert [timing[0] for timing in failed] == [str(tmp_path / 'notes.png')]
+    assert failed[0][1] is None
+    assert sorted(path.name for path in out_dir.iterdir()) == ['frame0.gif', 'frame1.gif', 'frame2.gif']
+    assert Image.open(str(out_dir / 'frame1.gif')).size == (5, 4)
+    report = capsys.readouterr().out
+    assert report.rstrip().endswith(str(tmp_path / 'notes.png') + ': ' + failed[0][3])
+    assert '1 files failed' in report
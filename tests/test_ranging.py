@@ -0,0 +1,67 @@
+import pytest
+import backend
+import ranging
+
+
+class FakeSensor:
+    """Stands in for Ultrasonic. Returns the given distances in turn, raising the ones that are exceptions"""
+
+    def __init__(self, distances):
+        self.distances = list(distances)
+
+    def sensor_get_value(self):
+        distance = self.distances.pop(0)
+        if isinstance(distance, Exception):
+            raise distance
+        return distance
+
+
+def ping_all(service, count):
+    for _ in range(count):
+        service.ping()
+        backend.sleep(service.period)
+
+
+def test_filter_drops_lost_echoes():
+    service = ranging.RangingService(FakeSensor([]))
+    assert service.filter([0, 40.0, 0, 42.0, 41.0]) == 41.0
+    assert service.filter([0, 0]) is None
+    assert service.filter([]) is None
+
+
+def test_filter_drops_outliers_around_the_median():
+    service = ranging.RangingService(FakeSensor([]))
+    # Median 40, median absolute deviation 1, so 60 is an outlier and the median of the rest is taken
+    assert service.filter([39.0, 40.0, 41.0, 60.0, 40.5]) == pytest.approx(40.25)
+    # Within min_spread of the median nothing is an outlier, even with no deviation at all
+    assert service.filter([40.0, 40.0, 40.0, 41.5]) == 40.0
+    assert ranging.RangingService(FakeSensor([]), min_spread=0.5).filter([40.0, 40.0, 40.0, 41.5, 41.5]) == 40.0
+
+
+def test_distance_of_the_latest_pings():
+    service = ranging.RangingService(FakeSensor([50.0, 48.0, 0, 46.0, 90.0, 44.0, 42.0]), window=5)
+    assert service.get_distance() is None
+    ping_all(service, 7)
+    time, distance = service.get_distance()
+    assert distance == 44.0  # 0 and 90 dropped from the last five pings
+    assert time == service.get_samples()[-2][0]  # The time of the median ping
+    assert service.update() == 44.0
+
+
+def test_stale_pings_are_not_used():
+    service = ranging.RangingService(FakeSensor([30.0] * 5), max_age=0.2)
+    ping_all(service, 5)
+    assert service.get_distance()[1] == 30.0
+    backend.sleep(0.3)
+    assert service.get_distance() is None
+    assert service.update() == 0  # update() starts the pinger, but the sensor has no distances left
+    service.stop()
+    assert service.errors > 0
+
+
+def test_failed_pings_are_counted():
+    error = OSError('echo pin')
+    service = ranging.RangingService(FakeSensor([30.0, error, 31.0]))
+    ping_all(service, 3)
+    assert service.errors == 1 and service.last_error is error
+    assert [distance for _, distance in service.get_samples()] == [30.0, 31.0]
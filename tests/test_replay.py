@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import backend
+import simulator
+import recording
+import replay
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_replay_selects_no_backend():
+    environment = dict(os.environ, PYTHONPATH=REPO)
+    environment.pop('PLAB_BACKEND', None)
+    code = 'import backend, replay; assert backend._backend is None'
+    subprocess.run([sys.executable, '-c', code], check=True, env=environment, cwd=REPO)
+
+
+def test_replay_repeats_the_recorded_session(tmp_path):
+    sim = backend.use('sim', world=simulator.World())
+    import bbcon
+    controller = bbcon.Bbcon(tick_rate=10)
+    controller.telemetry.close()
+    recorder = recording.Recorder(controller, str(tmp_path / 'session.log'))
+    motor_recs = []
+    while sim.world.time < 60 and not controller.halt_request:
+        controller.run_one_timestep()
+        motor_recs.append(controller.motor_recs)
+    recorder.close()
+    replayed = replay.main(str(tmp_path / 'session.log'))
+    assert replayed.tick == controller.tick
+    assert replayed.halt_request == controller.halt_request
+    assert replayed.motor_recs == motor_recs[-1]
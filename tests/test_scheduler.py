@@ -0,0 +1,21 @@
+import pytest
+import backend
+import simulator
+import scheduler
+
+
+def test_overruns_skip_the_ticks_they_wait_out():
+    world = backend.use('sim', world=simulator.World()).world
+    this_scheduler = scheduler.Scheduler(10)
+    this_scheduler.start()
+    delays = []
+    for work in (0.05, 0.13, 0.25, 0.02):  # Seconds each tick takes
+        world.time += work
+        delays.append(this_scheduler.delay())
+        world.time += delays[-1]
+    # Ends at 0.05 (in time), 0.23 (0.03 late for 0.2: waits for 0.3), 0.55 (0.15 late for 0.4: waits for 0.6)
+    # and 0.62
+    assert delays == pytest.approx([0.05, 0.07, 0.05, 0.08])
+    assert this_scheduler.overruns == 2
+    assert this_scheduler.skipped_ticks == 3
+    assert this_scheduler.ticks == 4
@@ -0,0 +1,120 @@
+import threading
+import pytest
+from PIL import Image
+import backend
+import simulator
+
+backend.use('sim', world=simulator.World())
+import bbcon  # noqa: E402  The sensobs of behavior.py are built on the backend selected above
+import behavior  # noqa: E402
+import ranging  # noqa: E402
+import sensob  # noqa: E402
+
+SPEED = 20.0  # cm/s of the approaches below
+
+
+def approach_distance():
+    """Distance to an obstacle approached at SPEED from 100 cm at time 0, on the simulated clock"""
+    return 100.0 - SPEED * backend.monotonic()
+
+
+class BlockingCamera:
+    """Stands in for Camera. update() blocks until released, like a slow raspistill capture"""
+
+    def __init__(self):
+        self.value = Image.new('RGB', (8, 6))
+        self.capturing = threading.Event()
+        self.release = threading.Event()
+
+    def get_value(self):
+        return self.value
+
+    def update(self):
+        self.capturing.set()
+        self.release.wait(5)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+def test_reset_does_not_wait_for_background_capture():
+    controller = bbcon.Bbcon()
+    camera_sensob = behavior.CAMERA_SENSOB
+    sensors, camera_sensob.sensors = camera_sensob.sensors, BlockingCamera()
+    try:
+        camera_sensob.prefetch()
+        assert camera_sensob.sensors.capturing.wait(5)
+        resetter = threading.Thread(target=controller.reset_sensobs)
+        resetter.start()
+        resetter.join(1.0)
+        assert not resetter.is_alive()
+        assert camera_sensob.value is None and camera_sensob.timestamp is None
+    finally:
+        camera_sensob.prefetch_until = 0.0
+        camera_sensob.sensors.release.set()
+        camera_sensob.worker.join(5)
+        camera_sensob.sensors = sensors
+    controller.telemetry.close()
+
+
+class ApproachSensor:
+    """Stands in for Ultrasonic (and for the sensor of a RangingService) on a steady approach"""
+
+    def __init__(self):
+        self.value = None
+
+    def get_value(self):
+        return self.value
+
+    def update(self):
+        self.value = approach_distance()
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+    def sensor_get_value(self):
+        return approach_distance()
+
+
+def test_contact_predicted_by_the_next_sample():
+    world = backend.use('sim', world=simulator.World()).world
+    controller = bbcon.Bbcon()
+    collision = next(b for b in controller.behaviors if isinstance(b, behavior.CollisionDetectionBehaviour))
+    distance_sensob = sensob.DistanceSensob()
+    distance_sensob.sensors = ApproachSensor()
+    collision.sensobs = distance_sensob
+    world.time = 2.2
+    for _ in range(12):  # 56 cm down to 12 cm
+        distance_sensob.update()
+        assert not distance_sensob.contact_within(collision.distance_threshold)
+        backend.sleep(0.2)
+    distance_sensob.update()  # 8 cm, so 4 cm at the next sample
+    assert distance_sensob.get_value() == pytest.approx(8.0)
+    assert distance_sensob.sample_interval() == pytest.approx(0.2)
+    assert distance_sensob.time_to_collision(collision.distance_threshold) == pytest.approx(0.1, abs=0.05)
+    assert distance_sensob.contact_within(collision.distance_threshold)
+    collision.consider_activation()
+    assert collision.active_flag and collision in controller.active_behaviors
+    collision.predict_contact = False
+    collision.consider_deactivation()
+    assert not collision.active_flag
+    controller.telemetry.close()
+
+
+def test_ranging_distance_is_tracked_at_its_time():
+    backend.use('sim', world=simulator.World())
+    distance_sensob = sensob.DistanceSensob()
+    service = ranging.RangingService(ApproachSensor())
+    distance_sensob.use_ranging(service)
+    try:
+        for _ in range(10):
+            backend.sleep(0.1)
+            distance_sensob.update()
+        now = backend.monotonic()
+        assert distance_sensob.tracker.time < service.get_samples()[-1][0]
+        assert distance_sensob.tracker.predict(now) == pytest.approx(approach_distance(), abs=0.5)
+        assert distance_sensob.closing_speed() == pytest.approx(SPEED, abs=1.0)
+    finally:
+        service.stop()
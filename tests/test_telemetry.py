@@ -0,0 +1,31 @@
+import math
+import telemetry
+
+
+def test_write_read_roundtrip(tmp_path):
+    path = str(tmp_path / 'telemetry.bin')
+    log = telemetry.Telemetry(['Search', 'Avoid'], ['DistanceSensob'], path, capacity=4, flush_interval=0.01)
+    log.log(0, 0, False, ['F', 0.5], [1.0, 0.0], [40.0])
+    log.log(1, 1, False, ['V', 0.25, -0.5], [1.0, 2.0], [float('nan')])
+    log.log(2, 1, True, ['S'], [0.0, 0.0], [5.0])
+    log.close()
+    records = list(telemetry.read(path))
+    assert [record['tick'] for record in records] == [0, 1, 2]
+    assert records[0]['winner'] == 'Search'
+    assert records[0]['motor_recs'] == ['F', 0.5]
+    assert records[0]['weights'] == {'Search': 1.0, 'Avoid': 0.0}
+    assert records[0]['sensob_values'] == {'DistanceSensob': 40.0}
+    assert records[1]['motor_recs'] == ['V', 0.25, -0.5]
+    assert math.isnan(records[1]['sensob_values']['DistanceSensob'])
+    assert records[2]['winner'] == 'Avoid' and records[2]['halt_request'] and records[2]['motor_recs'] == ['S']
+
+
+def test_many_behaviors_and_dropped_records():
+    names = ['Row%d' % i for i in range(200)]
+    log = telemetry.Telemetry(names, [], capacity=2)
+    for tick in range(3):
+        log.log(tick, 199, False, ['F', 1.0], [0.0] * 200, [])
+    records = log.get_records()
+    assert [record['tick'] for record in records] == [1, 2]
+    assert records[-1]['winner'] == 'Row199'
+    assert log.dropped == 1  # The oldest record was overwritten
@@ -0,0 +1,43 @@
+import math
+import pytest
+import tracking
+
+
+def approach(tracker, start=100.0, speed=10.0, period=0.3, count=20):
+    """Feeds readings of a constant-speed approach. Returns the time of the last one"""
+    for i in range(count):
+        tracker.add(i * period, start - speed * i * period)
+    return (count - 1) * period
+
+
+def test_constant_speed_approach():
+    tracker = tracking.AlphaBetaTracker()
+    last = approach(tracker)
+    distance = 100.0 - 10.0 * last
+    assert tracker.predict(last) == pytest.approx(distance, abs=0.1)
+    assert tracker.predict(last + 1.0) == pytest.approx(distance - 10.0, abs=0.2)
+    assert tracker.closing_speed() == pytest.approx(10.0, abs=0.1)
+    assert tracker.time_to_collision() == pytest.approx(distance / 10.0, abs=0.05)
+    assert tracker.time_to_collision(last + 0.2, distance=2.0) == pytest.approx((distance - 2.0) / 10.0 - 0.2, abs=0.05)
+    assert tracker.interval == pytest.approx(0.3)
+
+
+def test_no_collision_when_not_closing_in():
+    tracker = tracking.AlphaBetaTracker()
+    approach(tracker, start=20.0, speed=-5.0)
+    assert tracker.closing_speed() < 0
+    assert tracker.time_to_collision() == math.inf
+
+
+def test_lost_echoes_gaps_and_reset():
+    tracker = tracking.AlphaBetaTracker(max_gap=1.0)
+    assert tracker.predict(0.0) is None
+    tracker.add(0.0, 50.0)
+    tracker.add(0.3, 0)  # Lost echo
+    assert tracker.time == 0.0
+    tracker.add(0.6, 47.0)
+    assert tracker.closing_speed() > 0
+    tracker.add(5.0, 30.0)  # After a gap the track starts over
+    assert (tracker.distance, tracker.velocity, tracker.interval) == (30.0, 0.0, None)
+    tracker.reset()
+    assert tracker.predict(5.0) is None
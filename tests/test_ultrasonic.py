@@ -0,0 +1,36 @@
+import pytest
+import backend
+import simulator
+import ultrasonic
+
+
+def new_world(**kwargs):
+    return backend.use('sim', world=simulator.World(**kwargs)).world
+
+
+@pytest.mark.parametrize('heading', [0.0, 0.7, 1.6, 3.0])
+def test_edge_events_measure_what_polling_measures(heading):
+    world = new_world(heading=heading)
+    expected = world.front_distance()
+    polled = ultrasonic.Ultrasonic(pulse_delay=0).sensor_get_value()
+    timed = ultrasonic.Ultrasonic(edge_events=True, pulse_delay=0).sensor_get_value()
+    assert timed == pytest.approx(expected, abs=0.1)
+    assert polled == pytest.approx(expected, abs=1.0)  # The polling loop is only as exact as its poll interval
+
+
+def test_edge_events_give_up_a_lost_echo():
+    world = new_world()
+    sensor = ultrasonic.Ultrasonic(edge_events=True, pulse_delay=0, timeout=0.001)
+    assert 2 * world.front_distance() / simulator.SPEED_OF_SOUND > 0.001
+    assert sensor.sensor_get_value() == pytest.approx(sensor.compute_distance(0.001, 0))
+    assert sensor.sensor_get_value() == pytest.approx(sensor.compute_distance(0.001, 0))  # The timer is disarmed
+
+
+@pytest.mark.parametrize('edge_events', [False, True])
+def test_the_pulse_waits_pulse_delay(edge_events):
+    world = new_world()
+    sensor = ultrasonic.Ultrasonic(edge_events=edge_events, pulse_delay=0.3)
+    start = world.time
+    sensor.sensor_get_value()
+    echo = 2 * world.front_distance() / simulator.SPEED_OF_SOUND
+    assert 0.3 + echo <= world.time - start < 0.3 + echo + 0.01
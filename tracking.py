@@ -0,0 +1,66 @@
+"""Tracking of the distance to an obstacle from timestamped readings. An alpha-beta filter (a constant-velocity
+Kalman filter with fixed gains) estimates the distance and how fast it changes, which gives the time left until
+contact. Behaviors can then react to predicted contact instead of the latest single reading, so the ultrasonic
+sensor can be read less often without the robot running into the obstacle between two readings"""
+import math
+
+
+class AlphaBetaTracker:
+    """Estimates distance (cm) and velocity (cm/s, negative when closing in) from (time, distance) readings.
+    alpha, beta: gains of the distance and velocity corrections. The default beta, alpha^2 / (2 - alpha), gives
+    the critically damped filter for alpha
+    max_gap: seconds without a reading after which the track is restarted from the next reading
+    min_closing_speed: cm/s below which the robot is not considered to close in"""
+
+    def __init__(self, alpha=0.5, beta=None, max_gap=2.0, min_closing_speed=1.0):
+        self.alpha = alpha
+        self.beta = beta if beta is not None else alpha * alpha / (2 - alpha)
+        self.max_gap = max_gap
+        self.min_closing_speed = min_closing_speed
+        self.time = None  # Time of the latest reading, None before the first one
+        self.distance = None
+        self.velocity = 0.0
+        self.interval = None  # Seconds between the last two readings, None before the second one
+
+    def reset(self):
+        """Forgets the track"""
+        self.time = None
+        self.distance = None
+        self.velocity = 0.0
+        self.interval = None
+
+    def add(self, time, distance):
+        """Corrects the estimate with a reading. Readings of 0 or less (lost echoes) and readings at the time of the
+        last one are ignored. A reading older than the last one restarts the track, as after a gap"""
+        if distance is None or distance <= 0:
+            return
+        if self.time is None or not 0 <= time - self.time <= self.max_gap:
+            self.time, self.distance, self.velocity, self.interval = time, float(distance), 0.0, None
+            return
+        dt = time - self.time
+        if dt == 0:
+            return
+        predicted = self.distance + self.velocity * dt
+        residual = distance - predicted
+        self.distance = predicted + self.alpha * residual
+        self.velocity += self.beta * residual / dt
+        self.time = time
+        self.interval = dt
+
+    def predict(self, time):
+        """Returns the estimated distance at a time, None before the first reading"""
+        if self.time is None:
+            return None
+        return max(self.distance + self.velocity * (time - self.time), 0.0)
+
+    def closing_speed(self):
+        """Returns the speed in cm/s the distance shrinks at, negative when it grows"""
+        return -self.velocity
+
+    def time_to_collision(self, time=None, distance=0.0):
+        """Returns the seconds from time (the latest reading by default) until the distance is predicted to be down
+        to distance, math.inf if the robot is not closing in"""
+        if self.time is None or self.closing_speed() < self.min_closing_speed:
+            return math.inf
+        time = time if time is not None else self.time
+        return max((self.predict(time) - distance) / self.closing_speed(), 0.0)
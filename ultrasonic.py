@@ -1,12 +1,20 @@
-import RPi.GPIO as GPIO
-import time
+from backend import GPIO
+import backend
+import edge_timer
 
 class Ultrasonic():
 
-    def __init__(self):
+    # With edge_events, the echo pulse is timed with GPIO edge callbacks instead of polling loops.
+    # timeout: seconds the echo pin may stay high before the echo is given up (about 8 m round trip)
+    # pulse_delay: seconds to wait before each trigger pulse, 0 when the caller paces the measurements itself
+    def __init__(self, edge_events=False, timeout=0.05, pulse_delay=0.3):
         self.value = None
         self.trig_pin = 26
         self.echo_pin = 11
+        self.edge_events = edge_events
+        self.timeout = timeout
+        self.pulse_delay = pulse_delay
+        self.echo_timer = None  # EdgeTimer on the echo pin, made at the first measurement with edge_events
         self.setup()
 
     def setup(self):
@@ -22,6 +30,8 @@ class Ultrasonic():
         self.value = None
 
     def sensor_get_value(self):
+        if self.edge_events:
+            return self.sensor_get_value_edges()
         GPIO.setup(self.trig_pin, GPIO.OUT)
         GPIO.setup(self.echo_pin, GPIO.IN)
         self.send_activation_pulse()
@@ -37,18 +47,19 @@ class Ultrasonic():
         # signalet brukte fra det ble sendt ut til det ble returnert
 
         # Vi finner tiden paa siste gang echo signalet er lavt
-        signaloff_start = time.time()
+        signaloff_start = backend.monotonic()
         signaloff = signaloff_start
         # signalet timer ut dersom det tar mer en 0.5 s, da annsees det som tapt og vi prover igjen
         while read_val == 0 and signaloff - signaloff_start < 0.5:
             read_val = GPIO.input(self.echo_pin)
-            signaloff = time.time()
+            signaloff = backend.monotonic()
 
         signalon = signaloff
         # Finner saa den tiden det siste signalet kommer inn paa echo_pin
-        while read_val == 1:
+        # Gir opp etter timeout sekunder, saa et tapt ekko ikke henger programmet
+        while read_val == 1 and signalon - signaloff < self.timeout:
             read_val = GPIO.input(self.echo_pin)
-            signalon = time.time() # Kan flytte denne ut av loopen dersom det skaper delay og unoyaktighet
+            signalon = backend.monotonic() # Kan flytte denne ut av loopen dersom det skaper delay og unoyaktighet
 
         # Den kalkulerte avstanden
         distance = self.compute_distance(signalon, signaloff)
@@ -56,16 +67,39 @@ class Ultrasonic():
         # Returnerer distanset til objektet forran sensoren i cm
         return distance
 
-    def send_activation_pulse(self):
+    # The same measurement with edge callbacks: the rising and falling edge of the echo pulse are timestamped
+    # by the callbacks while this thread sleeps. No rising edge within 0.5 s gives 0 like the polling loop,
+    # no falling edge within timeout gives the distance of the timeout
+    def sensor_get_value_edges(self):
+        GPIO.setup(self.trig_pin, GPIO.OUT)
+        GPIO.setup(self.echo_pin, GPIO.IN)
+        if self.echo_timer is None:
+            self.echo_timer = edge_timer.EdgeTimer([self.echo_pin], GPIO.BOTH)
+        try:
+            self.send_activation_pulse(self.echo_timer.arm)
+            edges = self.echo_timer.wait(1, 0.5)[self.echo_pin]
+            if not edges:
+                return 0
+            edges = self.echo_timer.wait(2, self.timeout)[self.echo_pin]
+        finally:
+            self.echo_timer.disarm()
+        if len(edges) < 2:
+            return self.compute_distance(self.timeout, 0)
+        return self.compute_distance(edges[1] / 1e9, edges[0] / 1e9)
+
+    # before_trigger: called after the delay, just before the trigger pulse, e.g. to start listening for the echo
+    def send_activation_pulse(self, before_trigger=None):
         GPIO.output(self.trig_pin, GPIO.LOW)
         # Sensoren kan krasje dersom man ikke har et delay her. Dersom den fortsatt krasjer, prov aa oke delayet
-        time.sleep(0.3)
+        backend.sleep(self.pulse_delay)
+        if before_trigger:
+            before_trigger()
 
         # Ultralyd sensoren starter naar den mottar en puls, med lengde 10uS paa trig pinnen.
         # Vi gjor dette ved aa sette trig_pin hoy, venter i 10uS og setter den lav igjen.
         GPIO.output(self.trig_pin, True)
         # 0.00001 seconds = 10 micro seconds
-        time.sleep(0.00001)
+        backend.sleep(0.00001)
         GPIO.output(self.trig_pin, False)
 
     def compute_distance(self, signalon, signaloff):
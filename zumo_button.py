@@ -1,5 +1,5 @@
 __author__ = 'keithd'
-import wiringpi as wp
+from backend import wiringpi as wp
 
 class ZumoButton():
 